@@ -25,6 +25,15 @@ if config.config_file_name is not None:
 # Add your model's MetaData object here for 'autogenerate' support
 target_metadata = Base.metadata
 
+# Tables that exist in the database but are not modelled here
+# (APScheduler creates and manages its own job store table)
+EXTERNAL_TABLES = {"apscheduler_jobs"}
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    """Keep autogenerate from dropping tables we don't own"""
+    return not (type_ == "table" and name in EXTERNAL_TABLES)
+
 
 def run_migrations_offline() -> None:
     """
@@ -40,6 +49,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -64,7 +74,8 @@ def run_migrations_online() -> None:
     with connectable.connect() as connection:
         context.configure(
             connection=connection,
-            target_metadata=target_metadata
+            target_metadata=target_metadata,
+            include_object=include_object
         )
 
         with context.begin_transaction():
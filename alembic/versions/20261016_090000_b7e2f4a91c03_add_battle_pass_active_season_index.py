@@ -0,0 +1,33 @@
+"""Add partial index for active battle pass season lookup
+
+Revision ID: b7e2f4a91c03
+Revises: a1b2c3d4e5f6
+Create Date: 2026-10-16 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e2f4a91c03'
+down_revision: Union[str, None] = 'a1b2c3d4e5f6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Partial index covering the date window of active seasons only
+    op.create_index(
+        'ix_bp_season_active_window',
+        'battle_pass_seasons',
+        ['start_date', 'end_date'],
+        unique=False,
+        postgresql_where=sa.text('is_active')
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_bp_season_active_window', table_name='battle_pass_seasons')
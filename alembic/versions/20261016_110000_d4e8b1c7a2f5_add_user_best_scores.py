@@ -0,0 +1,51 @@
+"""Add user_best_scores table for leaderboard lookups
+
+Revision ID: d4e8b1c7a2f5
+Revises: b7e2f4a91c03
+Create Date: 2026-10-16 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4e8b1c7a2f5'
+down_revision: Union[str, None] = 'b7e2f4a91c03'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('user_best_scores',
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('game_mode', sa.String(length=50), nullable=False),
+    sa.Column('difficulty', sa.String(length=50), nullable=False),
+    sa.Column('best_score', sa.Integer(), nullable=False),
+    sa.Column('achieved_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'game_mode', 'difficulty')
+    )
+    op.create_index(
+        'ix_user_best_scores_leaderboard',
+        'user_best_scores',
+        ['game_mode', 'difficulty', sa.text('best_score DESC'), sa.text('user_id DESC')],
+        unique=False
+    )
+
+    # Backfill from existing scores (earliest occurrence of each best score)
+    op.execute("""
+        INSERT INTO user_best_scores (user_id, game_mode, difficulty, best_score, achieved_at)
+        SELECT DISTINCT ON (user_id, game_mode, difficulty)
+            user_id, game_mode, difficulty, score, created_at
+        FROM scores
+        WHERE user_id IS NOT NULL AND game_mode IS NOT NULL AND difficulty IS NOT NULL
+        ORDER BY user_id, game_mode, difficulty, score DESC, created_at ASC
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_user_best_scores_leaderboard', table_name='user_best_scores')
+    op.drop_table('user_best_scores')
@@ -0,0 +1,50 @@
+"""Add materialized views for weekly and daily leaderboards
+
+Revision ID: e5f1c8d3b6a7
+Revises: d4e8b1c7a2f5
+Create Date: 2026-10-16 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5f1c8d3b6a7'
+down_revision: Union[str, None] = 'd4e8b1c7a2f5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+VIEW_WINDOWS = {
+    'mv_leaderboard_weekly': "(now() AT TIME ZONE 'UTC') - interval '7 days'",
+    'mv_leaderboard_daily': "date_trunc('day', now() AT TIME ZONE 'UTC')",
+}
+
+
+def upgrade() -> None:
+    for view_name, window_start in VIEW_WINDOWS.items():
+        op.execute(f"""
+            CREATE MATERIALIZED VIEW IF NOT EXISTS {view_name} AS
+            SELECT user_id, game_mode, difficulty,
+                   MAX(score) AS max_score, MAX(created_at) AS latest_date
+            FROM scores
+            WHERE created_at >= {window_start}
+            GROUP BY user_id, game_mode, difficulty
+        """)
+        # Unique index is required for REFRESH MATERIALIZED VIEW CONCURRENTLY
+        op.execute(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS ix_{view_name}_user "
+            f"ON {view_name} (game_mode, difficulty, user_id)"
+        )
+        op.execute(
+            f"CREATE INDEX IF NOT EXISTS ix_{view_name}_rank "
+            f"ON {view_name} (game_mode, difficulty, max_score DESC, user_id DESC)"
+        )
+
+
+def downgrade() -> None:
+    for view_name in VIEW_WINDOWS:
+        op.execute(f"DROP MATERIALIZED VIEW IF EXISTS {view_name}")
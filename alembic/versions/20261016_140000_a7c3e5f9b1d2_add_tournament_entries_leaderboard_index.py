@@ -0,0 +1,40 @@
+"""Add leaderboard index on tournament_entries
+
+Revision ID: a7c3e5f9b1d2
+Revises: e5f1c8d3b6a7
+Create Date: 2026-10-16 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c3e5f9b1d2'
+down_revision: Union[str, None] = 'e5f1c8d3b6a7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Built concurrently so tournament score submissions aren't blocked
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_tournament_entries_leaderboard',
+            'tournament_entries',
+            ['tournament_id', sa.text('best_score DESC')],
+            unique=False,
+            postgresql_include=['user_id'],
+            postgresql_concurrently=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_tournament_entries_leaderboard',
+            table_name='tournament_entries',
+            postgresql_concurrently=True
+        )
@@ -0,0 +1,50 @@
+"""Add materialized view for active tournament leaderboards
+
+Revision ID: b8d4f6a2c3e9
+Revises: a7c3e5f9b1d2
+Create Date: 2026-10-16 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8d4f6a2c3e9'
+down_revision: Union[str, None] = 'a7c3e5f9b1d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+VIEW_NAME = 'mv_tournament_leaderboard'
+
+
+def upgrade() -> None:
+    op.execute(f"""
+        CREATE MATERIALIZED VIEW IF NOT EXISTS {VIEW_NAME} AS
+        SELECT te.tournament_id, te.user_id,
+               row_number() OVER w AS position,
+               rank() OVER w AS rank,
+               te.best_score, te.games_played,
+               u.username, u.display_name, u.photo_url
+        FROM tournament_entries te
+        JOIN tournaments t ON t.id = te.tournament_id
+        JOIN users u ON u.id = te.user_id
+        WHERE t.status = 'active'
+        WINDOW w AS (PARTITION BY te.tournament_id ORDER BY te.best_score DESC)
+    """)
+    # Unique index is required for REFRESH MATERIALIZED VIEW CONCURRENTLY
+    op.execute(
+        f"CREATE UNIQUE INDEX IF NOT EXISTS ix_{VIEW_NAME}_user "
+        f"ON {VIEW_NAME} (tournament_id, user_id)"
+    )
+    op.execute(
+        f"CREATE INDEX IF NOT EXISTS ix_{VIEW_NAME}_position "
+        f"ON {VIEW_NAME} (tournament_id, position)"
+    )
+
+
+def downgrade() -> None:
+    op.execute(f"DROP MATERIALIZED VIEW IF EXISTS {VIEW_NAME}")
@@ -0,0 +1,43 @@
+"""Add status indexes for friendship lookups
+
+Revision ID: c9e5a7b3d4f1
+Revises: b8d4f6a2c3e9
+Create Date: 2026-10-16 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c9e5a7b3d4f1'
+down_revision: Union[str, None] = 'b8d4f6a2c3e9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Built concurrently so friend requests aren't blocked
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_friendships_user_status',
+            'friendships',
+            ['user_id', 'status'],
+            unique=False,
+            postgresql_concurrently=True
+        )
+        op.create_index(
+            'ix_friendships_friend_status',
+            'friendships',
+            ['friend_id', 'status'],
+            unique=False,
+            postgresql_concurrently=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_friendships_friend_status', table_name='friendships', postgresql_concurrently=True)
+        op.drop_index('ix_friendships_user_status', table_name='friendships', postgresql_concurrently=True)
@@ -36,7 +36,7 @@ async def get_current_season(
     for level_data in (season.levels_config or []):
         levels.append(BattlePassLevel(**level_data))
 
-    return BattlePassSeasonResponse(
+    response = BattlePassSeasonResponse(
         id=season.id,
         season_id=season.season_id,
         name=season.name,
@@ -50,6 +50,9 @@ async def get_current_season(
         is_active=season.is_active,
         levels=levels
     )
+    db.commit()
+
+    return response
 
 
 @router.get("/progress", response_model=UserBattlePassProgressResponse)
@@ -58,9 +61,11 @@ async def get_my_progress(
     current_user: User = Depends(get_current_user)
 ):
     """Get current user's battle pass progress"""
-    season = battle_pass_service.get_or_create_season(db)
-    progress = battle_pass_service.get_user_progress(db, current_user.id, season)
-    return battle_pass_service.get_progress_response(progress, season)
+    season, progress = battle_pass_service.get_season_and_progress(db, current_user.id)
+    response = battle_pass_service.get_progress_response(progress, season)
+    db.commit()
+
+    return response
 
 
 @router.get("/user/{user_id}/progress", response_model=UserBattlePassProgressResponse)
@@ -70,9 +75,11 @@ async def get_user_progress(
     current_user: User = Depends(get_current_user)
 ):
     """Get another user's battle pass progress"""
-    season = battle_pass_service.get_or_create_season(db)
-    progress = battle_pass_service.get_user_progress(db, user_id, season)
-    return battle_pass_service.get_progress_response(progress, season)
+    season, progress = battle_pass_service.get_season_and_progress(db, user_id)
+    response = battle_pass_service.get_progress_response(progress, season)
+    db.commit()
+
+    return response
 
 
 @router.post("/add-xp", response_model=AddXPResponse)
@@ -138,8 +145,7 @@ async def purchase_premium(
             message=message
         )
 
-    season = battle_pass_service.get_or_create_season(db)
-    progress = battle_pass_service.get_user_progress(db, current_user.id, season)
+    _, progress = battle_pass_service.get_season_and_progress(db, current_user.id)
 
     return PurchasePremiumResponse(
         success=True,
@@ -156,12 +162,14 @@ async def get_levels(
 ):
     """Get all battle pass levels and rewards"""
     season = battle_pass_service.get_or_create_season(db)
-
-    return {
+    response = {
         "season_id": season.season_id,
         "levels": season.levels_config or [],
         "total_levels": season.max_level
     }
+    db.commit()
+
+    return response
 
 
 @router.get("/stats")
@@ -194,6 +202,7 @@ async def get_stats(
     ).scalar() or 0
 
     completion_rate = (max_level_users / total_users * 100) if total_users > 0 else 0
+    db.commit()
 
     return {
         "total_users": total_users,
@@ -2,7 +2,7 @@
 Leaderboard API endpoints
 """
 from typing import Optional
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 
 from app.database import get_db
@@ -20,13 +20,20 @@ async def get_global_leaderboard(
     difficulty: str = Query("normal", description="Difficulty level"),
     page: int = Query(1, ge=1, description="Page number"),
     page_size: int = Query(50, ge=1, le=100, description="Items per page"),
+    cursor: Optional[str] = Query(None, description="Cursor from a previous page's next_cursor (takes precedence over page)"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get global all-time leaderboard"""
-    return leaderboard_service.get_global_leaderboard(
-        db, game_mode, difficulty, page, page_size, current_user.id
-    )
+    try:
+        return leaderboard_service.get_global_leaderboard(
+            db, game_mode, difficulty, page, page_size, current_user.id, cursor
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
 
 
 @router.get("/weekly", response_model=LeaderboardResponse)
@@ -35,13 +42,20 @@ async def get_weekly_leaderboard(
     difficulty: str = Query("normal", description="Difficulty level"),
     page: int = Query(1, ge=1, description="Page number"),
     page_size: int = Query(50, ge=1, le=100, description="Items per page"),
+    cursor: Optional[str] = Query(None, description="Cursor from a previous page's next_cursor (takes precedence over page)"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get weekly leaderboard (scores from last 7 days)"""
-    return leaderboard_service.get_weekly_leaderboard(
-        db, game_mode, difficulty, page, page_size, current_user.id
-    )
+    try:
+        return leaderboard_service.get_weekly_leaderboard(
+            db, game_mode, difficulty, page, page_size, current_user.id, cursor
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
 
 
 @router.get("/daily", response_model=LeaderboardResponse)
@@ -50,13 +64,20 @@ async def get_daily_leaderboard(
     difficulty: str = Query("normal", description="Difficulty level"),
     page: int = Query(1, ge=1, description="Page number"),
     page_size: int = Query(50, ge=1, le=100, description="Items per page"),
+    cursor: Optional[str] = Query(None, description="Cursor from a previous page's next_cursor (takes precedence over page)"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get daily leaderboard (scores from today)"""
-    return leaderboard_service.get_daily_leaderboard(
-        db, game_mode, difficulty, page, page_size, current_user.id
-    )
+    try:
+        return leaderboard_service.get_daily_leaderboard(
+            db, game_mode, difficulty, page, page_size, current_user.id, cursor
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
 
 
 @router.get("/friends", response_model=LeaderboardResponse)
@@ -65,10 +86,17 @@ async def get_friends_leaderboard(
     difficulty: str = Query("normal", description="Difficulty level"),
     page: int = Query(1, ge=1, description="Page number"),
     page_size: int = Query(50, ge=1, le=100, description="Items per page"),
+    cursor: Optional[str] = Query(None, description="Cursor from a previous page's next_cursor (takes precedence over page)"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get friends leaderboard (you and your friends)"""
-    return leaderboard_service.get_friends_leaderboard(
-        db, current_user.id, game_mode, difficulty, page, page_size
-    )
+    try:
+        return leaderboard_service.get_friends_leaderboard(
+            db, current_user.id, game_mode, difficulty, page, page_size, cursor
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
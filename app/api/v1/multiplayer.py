@@ -40,7 +40,8 @@ async def create_game(
             mode=request.mode,
             max_players=request.max_players,
             grid_size=request.grid_size,
-            speed=request.speed
+            speed=request.speed,
+            user=current_user
         )
         return GameCreateResponse(
             success=True,
@@ -64,7 +65,7 @@ async def join_game(
     """Join a game by room code"""
     try:
         game, player_index = multiplayer_service.join_game_by_code(
-            db, current_user.id, request.room_code
+            db, current_user.id, request.room_code, user=current_user
         )
         return GameJoinResponse(
             success=True,
@@ -205,10 +206,7 @@ async def game_websocket(websocket: WebSocket, game_id: str):
     # Send initial state
     state = multiplayer_service.get_game_state(game_id)
     if state:
-        await websocket.send_json({
-            "type": "game_state",
-            "data": state.model_dump(mode="json")
-        })
+        await websocket.send_text(multiplayer_service.game_state_message(state))
 
     db = SessionLocal()
 
@@ -270,18 +268,23 @@ async def game_websocket(websocket: WebSocket, game_id: str):
 
 async def _broadcast_to_game(game_id: str, message: dict):
     """Broadcast a message to all players in a game"""
+    await _broadcast_text_to_game(game_id, json.dumps(message, separators=(",", ":")))
+
+
+async def _broadcast_text_to_game(game_id: str, payload: str):
+    """Broadcast an already-serialized message to all players in a game"""
     connections = multiplayer_service.game_connections.get(game_id, set())
-    dead_connections = set()
+    targets = list(connections)
 
-    for ws in connections:
-        try:
-            await ws.send_json(message)
-        except Exception:
-            dead_connections.add(ws)
+    results = await asyncio.gather(
+        *(ws.send_text(payload) for ws in targets),
+        return_exceptions=True
+    )
 
     # Remove dead connections
-    for ws in dead_connections:
-        connections.discard(ws)
+    for ws, result in zip(targets, results):
+        if isinstance(result, Exception):
+            connections.discard(ws)
 
 
 async def _game_loop(db: Session, game_id: str):
@@ -295,11 +298,12 @@ async def _game_loop(db: Session, game_id: str):
             # Process game tick
             state = multiplayer_service.tick_game(db, game_id)
 
+            # Skip the broadcast when nothing changed since the last one
             if state:
-                await _broadcast_to_game(game_id, {
-                    "type": "game_state",
-                    "data": state.model_dump(mode="json")
-                })
+                payload = multiplayer_service.game_state_message(state)
+                if payload != game.last_broadcast:
+                    game.last_broadcast = payload
+                    await _broadcast_text_to_game(game_id, payload)
 
             if game.status == "finished":
                 await _broadcast_to_game(game_id, {
@@ -111,8 +111,7 @@ async def get_recent_scores(
     current_user: User = Depends(get_current_user)
 ):
     """Get recent scores from all users"""
-    scores = score_service.get_recent_scores(db, limit, game_mode)
-    return [ScoreResponse.model_validate(s) for s in scores]
+    return score_service.get_recent_scores(db, limit, game_mode)
 
 
 @router.post("/batch", response_model=BatchScoreSubmitResponse, status_code=status.HTTP_201_CREATED)
@@ -143,7 +142,7 @@ async def submit_scores_batch(
             successful += 1  # Duplicates are still "successful" (idempotent)
             results.append(BatchScoreResult(
                 index=i, success=True,
-                score=ScoreResponse.model_validate(score),
+                score=score,
                 is_high_score=is_high, rank=rank, was_duplicate=True
             ))
         else:
@@ -162,7 +161,7 @@ async def submit_scores_batch(
 
             results.append(BatchScoreResult(
                 index=i, success=True,
-                score=ScoreResponse.model_validate(score),
+                score=score,
                 is_high_score=is_high, rank=rank, was_duplicate=False
             ))
 
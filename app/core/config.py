@@ -49,6 +49,9 @@ class Settings(BaseSettings):
     API_V1_PREFIX: str = "/api/v1"
     PROJECT_NAME: str = "Snake Classic API"
     DEBUG: bool = True
+    # Uvicorn worker processes (ignored while reloading). Keep at 1 unless
+    # multiplayer rooms and the scheduler run elsewhere: both live in-process.
+    API_WORKERS: int = 1
 
     # CORS Configuration
     ALLOWED_ORIGINS: str = "*"
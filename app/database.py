@@ -1,6 +1,8 @@
 """
 Database connection and session management for Snake Classic Backend
 """
+import json
+from functools import partial
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
@@ -12,7 +14,12 @@ engine = create_engine(
     pool_pre_ping=True,      # Test connections before using
     pool_size=10,            # Connection pool size
     max_overflow=20,         # Overflow connections allowed
-    echo=settings.DEBUG      # Log SQL queries in debug mode
+    echo=settings.DEBUG,     # Log SQL queries in debug mode
+    # Batch executemany UPDATE/DELETE (e.g. bulk player snapshot saves) into
+    # paged round trips; INSERTs already use insertmanyvalues
+    executemany_mode="values_plus_batch",
+    # Compact JSON/JSONB parameters (no whitespace after separators)
+    json_serializer=partial(json.dumps, separators=(",", ":"))
 )
 
 # Session factory for creating database sessions
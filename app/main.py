@@ -20,6 +20,7 @@ from .database import init_db
 from .api.v1 import api_router
 from .routes import notifications, test, purchases, battle_pass
 from .services.scheduler_service import scheduler_service
+from .utils.cache import TTLCache
 
 # Configure logging
 logging.basicConfig(
@@ -85,6 +86,11 @@ async def lifespan(app: FastAPI):
         scheduler_service.shutdown()
         print("[OK] Scheduler service stopped")
 
+        # Flush pending multiplayer writes
+        from .services.multiplayer_service import multiplayer_service
+        await multiplayer_service.stop_writer()
+        print("[OK] Multiplayer writer stopped")
+
     except Exception as e:
         logger.error(f"Error during shutdown: {e}")
 
@@ -181,18 +187,33 @@ async def root():
 
 
 # Health check endpoint
+# Seconds the scheduler part of /health is reused. Counting jobs reads the
+# database-backed job store, which monitors polling /health shouldn't hit
+# on every probe.
+HEALTH_SCHEDULER_TTL = 5
+_health_cache = TTLCache(ttl_seconds=HEALTH_SCHEDULER_TTL, max_size=1)
+
+
+def _scheduler_health() -> dict:
+    """Scheduler status and job count, cached for HEALTH_SCHEDULER_TTL seconds"""
+    snapshot = _health_cache.get("scheduler")
+    if snapshot is None:
+        scheduler = scheduler_service.scheduler
+        running = scheduler.running if scheduler else False
+        snapshot = {
+            "status": "running" if running else "stopped",
+            "scheduled_jobs": len(scheduler.get_jobs()) if scheduler else 0
+        }
+        _health_cache.set("scheduler", snapshot)
+    return snapshot
+
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint for monitoring."""
     from app.utils.time_utils import to_utc_isoformat, utc_now
 
     try:
-        # Check scheduler status
-        scheduler_running = scheduler_service.scheduler.running if scheduler_service.scheduler else False
-
-        # Get scheduled jobs count
-        scheduled_jobs = len(scheduler_service.get_scheduled_jobs()) if scheduler_service.scheduler else 0
-
         return {
             "status": "healthy",
             "timestamp": to_utc_isoformat(utc_now()),
@@ -203,10 +224,7 @@ async def health_check():
                     "status": "connected",
                     "host": settings.DATABASE_HOST
                 },
-                "scheduler": {
-                    "status": "running" if scheduler_running else "stopped",
-                    "scheduled_jobs": scheduled_jobs
-                },
+                "scheduler": _scheduler_health(),
                 "firebase": {
                     "status": "connected",
                     "project_id": settings.FIREBASE_PROJECT_ID
@@ -4,7 +4,7 @@ Database models for Snake Classic Backend
 All models should be imported here for Alembic to detect them.
 """
 from app.models.user import User, UserPreferences, FCMToken, UserPremiumContent
-from app.models.score import Score, GameReplay
+from app.models.score import Score, UserBestScore, GameReplay
 from app.models.achievement import Achievement, UserAchievement
 from app.models.social import Friendship
 from app.models.tournament import Tournament, TournamentEntry
@@ -20,6 +20,7 @@ __all__ = [
     "UserPremiumContent",
     # Score
     "Score",
+    "UserBestScore",
     "GameReplay",
     # Achievement
     "Achievement",
@@ -2,7 +2,7 @@
 Battle Pass system models
 """
 from uuid import uuid4
-from sqlalchemy import Column, String, Integer, Boolean, DateTime, Text, ForeignKey, UniqueConstraint, Numeric
+from sqlalchemy import Column, String, Integer, Boolean, DateTime, Text, ForeignKey, UniqueConstraint, Numeric, Index, text
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import relationship
 from app.database import Base
@@ -43,6 +43,11 @@ class BattlePassSeason(Base):
     # Timestamps
     created_at = Column(DateTime, default=utc_now)
 
+    # Partial index for the current active season lookup
+    __table_args__ = (
+        Index('ix_bp_season_active_window', 'start_date', 'end_date', postgresql_where=text('is_active')),
+    )
+
     # Relationships
     user_progress = relationship("UserBattlePassProgress", back_populates="season", cascade="all, delete-orphan")
 
@@ -2,7 +2,10 @@
 Score and game session models
 """
 from uuid import uuid4
-from sqlalchemy import Column, String, Integer, Boolean, DateTime, ForeignKey, Text, Index, text
+from sqlalchemy import (
+    Column, String, Integer, Boolean, DateTime, ForeignKey, Text, Index, text,
+    DDL, event, table, column
+)
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import relationship
 from app.database import Base
@@ -46,6 +49,67 @@ class Score(Base):
     )
 
 
+# Materialized views backing the weekly and daily leaderboards, keyed by view
+# name with the window start they aggregate from. Refreshed by the scheduler.
+LEADERBOARD_VIEW_WINDOWS = {
+    "mv_leaderboard_weekly": "(now() AT TIME ZONE 'UTC') - interval '7 days'",
+    "mv_leaderboard_daily": "date_trunc('day', now() AT TIME ZONE 'UTC')",
+}
+
+
+def _leaderboard_view(name: str):
+    """Lightweight selectable for a leaderboard materialized view"""
+    return table(
+        name,
+        column("user_id", UUID(as_uuid=True)),
+        column("game_mode", String),
+        column("difficulty", String),
+        column("max_score", Integer),
+        column("latest_date", DateTime),
+    )
+
+
+weekly_leaderboard_view = _leaderboard_view("mv_leaderboard_weekly")
+daily_leaderboard_view = _leaderboard_view("mv_leaderboard_daily")
+
+# Create the views alongside the scores table when using metadata.create_all
+for _view_name, _window_start in LEADERBOARD_VIEW_WINDOWS.items():
+    event.listen(Score.__table__, "after_create", DDL(f"""
+        CREATE MATERIALIZED VIEW IF NOT EXISTS {_view_name} AS
+        SELECT user_id, game_mode, difficulty,
+               MAX(score) AS max_score, MAX(created_at) AS latest_date
+        FROM scores
+        WHERE created_at >= {_window_start}
+        GROUP BY user_id, game_mode, difficulty
+    """))
+    # Unique index is required for REFRESH MATERIALIZED VIEW CONCURRENTLY
+    event.listen(Score.__table__, "after_create", DDL(
+        f"CREATE UNIQUE INDEX IF NOT EXISTS ix_{_view_name}_user "
+        f"ON {_view_name} (game_mode, difficulty, user_id)"
+    ))
+    event.listen(Score.__table__, "after_create", DDL(
+        f"CREATE INDEX IF NOT EXISTS ix_{_view_name}_rank "
+        f"ON {_view_name} (game_mode, difficulty, max_score DESC, user_id DESC)"
+    ))
+
+
+class UserBestScore(Base):
+    """Best score per user, game mode and difficulty (maintained on score submit)"""
+    __tablename__ = "user_best_scores"
+
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    game_mode = Column(String(50), primary_key=True)
+    difficulty = Column(String(50), primary_key=True)
+
+    best_score = Column(Integer, nullable=False)
+    achieved_at = Column(DateTime, default=utc_now)
+
+    # Leaderboard order within a mode/difficulty
+    __table_args__ = (
+        Index('ix_user_best_scores_leaderboard', 'game_mode', 'difficulty', text('best_score DESC'), text('user_id DESC')),
+    )
+
+
 class GameReplay(Base):
     """Stored game replay data for playback"""
     __tablename__ = "game_replays"
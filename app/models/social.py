@@ -2,7 +2,7 @@
 Social features models - Friends and friend requests
 """
 from uuid import uuid4
-from sqlalchemy import Column, String, DateTime, ForeignKey, UniqueConstraint
+from sqlalchemy import Column, String, DateTime, ForeignKey, UniqueConstraint, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from app.database import Base
@@ -27,6 +27,9 @@ class Friendship(Base):
     # Unique constraint to prevent duplicate friendships
     __table_args__ = (
         UniqueConstraint('user_id', 'friend_id', name='unique_friendship'),
+        # Both sides of the "user_id = :u OR friend_id = :u" status lookups
+        Index('ix_friendships_user_status', 'user_id', 'status'),
+        Index('ix_friendships_friend_status', 'friend_id', 'status'),
     )
 
     # Relationships
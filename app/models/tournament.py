@@ -2,7 +2,10 @@
 Tournament system models
 """
 from uuid import uuid4
-from sqlalchemy import Column, String, Integer, Boolean, DateTime, Text, ForeignKey, UniqueConstraint
+from sqlalchemy import (
+    Column, String, Integer, Boolean, DateTime, Text, ForeignKey, UniqueConstraint, Index,
+    DDL, event, table, column
+)
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import relationship
 from app.database import Base
@@ -75,3 +78,55 @@ class TournamentEntry(Base):
     # Relationships
     tournament = relationship("Tournament", back_populates="entries")
     user = relationship("User")
+
+
+# Tournament leaderboard order; user_id is included so rank counts and pages
+# are answered from the index alone
+Index(
+    'ix_tournament_entries_leaderboard',
+    TournamentEntry.tournament_id,
+    TournamentEntry.best_score.desc(),
+    postgresql_include=['user_id']
+)
+
+
+# Pre-ranked leaderboards for active tournaments, refreshed by the scheduler.
+# position orders the page; rank is the competition rank (ties share a rank).
+TOURNAMENT_LEADERBOARD_VIEW = "mv_tournament_leaderboard"
+
+tournament_leaderboard_view = table(
+    TOURNAMENT_LEADERBOARD_VIEW,
+    column("tournament_id", UUID(as_uuid=True)),
+    column("user_id", UUID(as_uuid=True)),
+    column("position", Integer),
+    column("rank", Integer),
+    column("best_score", Integer),
+    column("games_played", Integer),
+    column("username", String),
+    column("display_name", String),
+    column("photo_url", String),
+)
+
+# Create the view alongside the entries table when using metadata.create_all
+event.listen(TournamentEntry.__table__, "after_create", DDL(f"""
+    CREATE MATERIALIZED VIEW IF NOT EXISTS {TOURNAMENT_LEADERBOARD_VIEW} AS
+    SELECT te.tournament_id, te.user_id,
+           row_number() OVER w AS position,
+           rank() OVER w AS rank,
+           te.best_score, te.games_played,
+           u.username, u.display_name, u.photo_url
+    FROM tournament_entries te
+    JOIN tournaments t ON t.id = te.tournament_id
+    JOIN users u ON u.id = te.user_id
+    WHERE t.status = 'active'
+    WINDOW w AS (PARTITION BY te.tournament_id ORDER BY te.best_score DESC)
+"""))
+# Unique index is required for REFRESH MATERIALIZED VIEW CONCURRENTLY
+event.listen(TournamentEntry.__table__, "after_create", DDL(
+    f"CREATE UNIQUE INDEX IF NOT EXISTS ix_{TOURNAMENT_LEADERBOARD_VIEW}_user "
+    f"ON {TOURNAMENT_LEADERBOARD_VIEW} (tournament_id, user_id)"
+))
+event.listen(TournamentEntry.__table__, "after_create", DDL(
+    f"CREATE INDEX IF NOT EXISTS ix_{TOURNAMENT_LEADERBOARD_VIEW}_position "
+    f"ON {TOURNAMENT_LEADERBOARD_VIEW} (tournament_id, position)"
+))
@@ -12,6 +12,16 @@ class Position(BaseModel):
     x: int
     y: int
 
+    def pack(self, grid_size: int) -> int:
+        """Encode as a single cell index (y * grid_size + x)"""
+        return self.y * grid_size + self.x
+
+    @classmethod
+    def unpack(cls, cell: int, grid_size: int) -> "Position":
+        """Decode a cell index produced by pack()"""
+        y, x = divmod(cell, grid_size)
+        return cls(x=x, y=y)
+
 
 class PlayerState(BaseModel):
     """Player state in a multiplayer game"""
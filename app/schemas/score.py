@@ -67,6 +67,8 @@ class LeaderboardResponse(BaseModel):
     page_size: int
     user_rank: Optional[int] = None
     user_score: Optional[int] = None
+    next_cursor: Optional[str] = None  # Pass back as `cursor` to fetch the next page
+    has_more: bool = False
 
 
 class UserScoreStats(BaseModel):
@@ -2,20 +2,23 @@
 Battle Pass service for managing battle pass progression
 """
 import logging
+from bisect import bisect_right
+from itertools import accumulate
 from typing import Optional, List, Dict, Any, Tuple
 from uuid import UUID
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, and_, update, values, column, cast, Integer
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID, JSONB, insert as pg_insert
 
 from app.models.battle_pass import BattlePassSeason, UserBattlePassProgress
-from app.models.user import UserPremiumContent
 from app.schemas.battle_pass import (
     BattlePassReward,
     BattlePassLevel,
     BattlePassSeasonResponse,
     UserBattlePassProgressResponse,
 )
+from app.services.purchase_service import purchase_service
 from app.utils.time_utils import utc_now
 
 logger = logging.getLogger(__name__)
@@ -67,20 +70,66 @@ def generate_levels_config() -> List[Dict]:
     return levels
 
 
+def compute_level(total_xp: int, cum_xp: List[int], max_level: int) -> int:
+    """Level reached with total_xp, given a cumulative XP table"""
+    return min(bisect_right(cum_xp, total_xp) + 1, max_level)
+
+
+def compute_levels_bulk(
+    total_xps: List[int],
+    cum_xp: List[int],
+    max_level: int
+) -> List[int]:
+    """Levels reached for many XP totals against the same cumulative XP table"""
+    return [min(bisect_right(cum_xp, xp) + 1, max_level) for xp in total_xps]
+
+
 class BattlePassService:
     """Service for battle pass operations"""
 
-    def get_current_season(self, db: Session) -> Optional[BattlePassSeason]:
-        """Get current active battle pass season"""
+    def __init__(self):
+        # Level configs keyed by level number, cached per season
+        self._levels_index_cache: Dict[UUID, Dict[int, Dict]] = {}
+        # Cumulative XP needed to complete each level, cached per season
+        self._cum_xp_cache: Dict[UUID, List[int]] = {}
+
+    def _get_levels_index(self, season: BattlePassSeason) -> Dict[int, Dict]:
+        """Get the season's level config indexed by level number"""
+        levels_index = self._levels_index_cache.get(season.id)
+        if levels_index is None:
+            levels_config = season.levels_config or generate_levels_config()
+            levels_index = {l["level"]: l for l in levels_config}
+            self._levels_index_cache[season.id] = levels_index
+        return levels_index
+
+    def _get_cum_xp(self, season: BattlePassSeason) -> List[int]:
+        """Get the season's cumulative XP table (entry i = XP to complete level i + 1)"""
+        cum_xp = self._cum_xp_cache.get(season.id)
+        if cum_xp is None:
+            levels_config = season.levels_config or generate_levels_config()
+            cum_xp = list(accumulate(
+                l["xp_required"] for l in sorted(levels_config, key=lambda l: l["level"])
+            ))
+            self._cum_xp_cache[season.id] = cum_xp
+        return cum_xp
+
+    def _current_season_filters(self) -> Tuple:
+        """Filter criteria matching the current active season"""
         now = utc_now()
-        return db.query(BattlePassSeason).filter(
+        return (
             BattlePassSeason.is_active == True,
             BattlePassSeason.start_date <= now,
             BattlePassSeason.end_date >= now
+        )
+
+    def get_current_season(self, db: Session) -> Optional[BattlePassSeason]:
+        """Get current active battle pass season"""
+        return db.query(BattlePassSeason).filter(
+            *self._current_season_filters()
         ).first()
 
     def get_or_create_season(self, db: Session) -> BattlePassSeason:
-        """Get current season or create a default one"""
+        """Get current season or create a default one (caller commits)"""
         season = self.get_current_season(db)
         if season:
             return season
@@ -100,9 +149,10 @@ class BattlePassService:
             levels_config=generate_levels_config(),
             is_active=True
         )
+        # Flush only: every column is set client-side, so there is nothing
+        # to refresh, and the caller's commit persists the row
         db.add(season)
-        db.commit()
-        db.refresh(season)
+        db.flush()
         return season
 
     def get_user_progress(
@@ -111,7 +161,7 @@ class BattlePassService:
         user_id: UUID,
         season: Optional[BattlePassSeason] = None
     ) -> UserBattlePassProgress:
-        """Get or create user's battle pass progress"""
+        """Get or create user's battle pass progress (caller commits)"""
         if not season:
             season = self.get_or_create_season(db)
 
@@ -131,11 +181,39 @@ class BattlePassService:
                 claimed_rewards=[]
             )
             db.add(progress)
-            db.commit()
-            db.refresh(progress)
+            db.flush()
 
         return progress
 
+    def get_season_and_progress(
+        self,
+        db: Session,
+        user_id: UUID
+    ) -> Tuple[BattlePassSeason, UserBattlePassProgress]:
+        """
+        Get the current season and the user's progress in a single query.
+        Creates either one if missing (caller commits).
+        """
+        row = db.query(BattlePassSeason, UserBattlePassProgress).outerjoin(
+            UserBattlePassProgress,
+            and_(
+                UserBattlePassProgress.season_id == BattlePassSeason.id,
+                UserBattlePassProgress.user_id == user_id
+            )
+        ).filter(
+            *self._current_season_filters()
+        ).first()
+
+        if row:
+            season, progress = row
+        else:
+            season, progress = self.get_or_create_season(db), None
+
+        if not progress:
+            progress = self.get_user_progress(db, user_id, season)
+
+        return season, progress
+
     def add_xp(
         self,
         db: Session,
@@ -146,48 +224,177 @@ class BattlePassService:
         Add XP to user's battle pass.
         Returns: (progress, old_level, new_level, leveled_up, rewards_unlocked)
         """
-        season = self.get_or_create_season(db)
-        progress = self.get_user_progress(db, user_id, season)
+        season, progress = self.get_season_and_progress(db, user_id)
 
+        if xp_amount == 0:
+            level = progress.current_level
+            db.commit()
+            return progress, level, level, False, []
+
+        old_level, new_level = self._apply_xp(season, progress, xp_amount)
+
+        # Common case: no level boundary crossed, nothing unlocked
+        if new_level == old_level:
+            db.commit()
+            return progress, old_level, new_level, False, []
+
+        leveled_up = new_level > old_level
+        rewards_unlocked = self._get_unlocked_rewards(
+            season, old_level, new_level, progress.has_premium
+        )
+
+        db.commit()
+
+        return progress, old_level, new_level, leveled_up, rewards_unlocked
+
+    def _apply_xp(
+        self,
+        season: BattlePassSeason,
+        progress: UserBattlePassProgress,
+        xp_amount: int
+    ) -> Tuple[int, int]:
+        """
+        Add XP to a progress row and recompute its level (caller commits).
+        Returns: (old_level, new_level)
+        """
         old_level = progress.current_level
         progress.current_xp += xp_amount
         progress.total_xp_earned += xp_amount
 
-        # Calculate new level
-        levels_config = season.levels_config or generate_levels_config()
-        total_xp = progress.current_xp
-        new_level = 1
-        xp_accumulated = 0
-
-        for level_data in levels_config:
-            level_xp = level_data["xp_required"]
-            if total_xp >= xp_accumulated + level_xp:
-                xp_accumulated += level_xp
-                new_level = level_data["level"] + 1
-            else:
-                break
-
-        new_level = min(new_level, season.max_level)
+        new_level = self._calculate_level(season, progress.current_xp)
         progress.current_level = new_level
 
+        return old_level, new_level
+
+    def add_xp_bulk(
+        self,
+        db: Session,
+        xp_awards: List[Tuple[UUID, int]]
+    ) -> Dict[UUID, Tuple[int, int, bool, List[str]]]:
+        """
+        Add XP to many users' battle passes with set-oriented statements
+        and a single commit.
+        Returns: {user_id: (old_level, new_level, leveled_up, rewards_unlocked)}
+        """
+        # Merge repeated awards for the same user
+        xp_by_user: Dict[UUID, int] = {}
+        for user_id, xp_amount in xp_awards:
+            xp_by_user[user_id] = xp_by_user.get(user_id, 0) + xp_amount
+
+        if not xp_by_user:
+            return {}
+
+        season = self.get_or_create_season(db)
+
+        # Make sure every user has a progress row to update
+        db.execute(
+            pg_insert(UserBattlePassProgress).values([
+                {
+                    "user_id": user_id,
+                    "season_id": season.id,
+                    "has_premium": False,
+                    "current_level": 1,
+                    "current_xp": 0,
+                    "total_xp_earned": 0,
+                    "claimed_rewards": [],
+                }
+                for user_id in xp_by_user
+            ]).on_conflict_do_nothing(constraint="unique_user_season_progress")
+        )
+
+        awards = values(
+            column("user_id", PG_UUID(as_uuid=True)),
+            column("xp", Integer),
+            name="awards"
+        ).data(list(xp_by_user.items()))
+
+        rows = db.execute(
+            update(UserBattlePassProgress)
+            .where(
+                UserBattlePassProgress.season_id == season.id,
+                UserBattlePassProgress.user_id == awards.c.user_id
+            )
+            .values(
+                current_xp=UserBattlePassProgress.current_xp + awards.c.xp,
+                total_xp_earned=UserBattlePassProgress.total_xp_earned + awards.c.xp,
+                updated_at=utc_now()
+            )
+            .returning(
+                UserBattlePassProgress.user_id,
+                UserBattlePassProgress.current_xp,
+                UserBattlePassProgress.current_level,
+                UserBattlePassProgress.has_premium
+            )
+            .execution_options(synchronize_session=False)
+        ).all()
+
+        results: Dict[UUID, Tuple[int, int, bool, List[str]]] = {}
+        level_changes: List[Tuple[UUID, int]] = []
+
+        new_levels_list = compute_levels_bulk(
+            [row.current_xp for row in rows],
+            self._get_cum_xp(season),
+            season.max_level
+        )
+
+        for (user_id, _, old_level, has_premium), new_level in zip(rows, new_levels_list):
+            leveled_up = new_level > old_level
+            if new_level != old_level:
+                level_changes.append((user_id, new_level))
+            results[user_id] = (
+                old_level,
+                new_level,
+                leveled_up,
+                self._get_unlocked_rewards(season, old_level, new_level, has_premium)
+            )
+
+        if level_changes:
+            new_levels = values(
+                column("user_id", PG_UUID(as_uuid=True)),
+                column("level", Integer),
+                name="new_levels"
+            ).data(level_changes)
+
+            db.execute(
+                update(UserBattlePassProgress)
+                .where(
+                    UserBattlePassProgress.season_id == season.id,
+                    UserBattlePassProgress.user_id == new_levels.c.user_id
+                )
+                .values(current_level=new_levels.c.level)
+                .execution_options(synchronize_session=False)
+            )
+
         db.commit()
 
-        leveled_up = new_level > old_level
+        return results
+
+    def _calculate_level(self, season: BattlePassSeason, total_xp: int) -> int:
+        """Calculate the level reached with the given amount of XP"""
+        return compute_level(total_xp, self._get_cum_xp(season), season.max_level)
+
+    def _get_unlocked_rewards(
+        self,
+        season: BattlePassSeason,
+        old_level: int,
+        new_level: int,
+        has_premium: bool
+    ) -> List[str]:
+        """Get reward ids unlocked when going from old_level to new_level"""
         rewards_unlocked = []
+        if new_level <= old_level:
+            return rewards_unlocked
 
-        if leveled_up:
-            for lvl in range(old_level + 1, new_level + 1):
-                level_config = next(
-                    (l for l in levels_config if l["level"] == lvl),
-                    None
-                )
-                if level_config:
-                    if level_config.get("free_reward"):
-                        rewards_unlocked.append(f"free_{lvl}")
-                    if progress.has_premium and level_config.get("premium_reward"):
-                        rewards_unlocked.append(f"premium_{lvl}")
+        levels_index = self._get_levels_index(season)
+        for lvl in range(old_level + 1, new_level + 1):
+            level_config = levels_index.get(lvl)
+            if level_config:
+                if level_config.get("free_reward"):
+                    rewards_unlocked.append(f"free_{lvl}")
+                if has_premium and level_config.get("premium_reward"):
+                    rewards_unlocked.append(f"premium_{lvl}")
 
-        return progress, old_level, new_level, leveled_up, rewards_unlocked
+        return rewards_unlocked
 
     def claim_reward(
         self,
@@ -200,8 +407,7 @@ class BattlePassService:
         Claim a battle pass reward.
         Returns: (success, reward, message)
         """
-        season = self.get_or_create_season(db)
-        progress = self.get_user_progress(db, user_id, season)
+        season, progress = self.get_season_and_progress(db, user_id)
 
         # Check level requirement
         if progress.current_level < level:
@@ -217,11 +423,7 @@ class BattlePassService:
             return False, None, "Reward already claimed"
 
         # Find reward
-        levels_config = season.levels_config or generate_levels_config()
-        level_config = next(
-            (l for l in levels_config if l["level"] == level),
-            None
-        )
+        level_config = self._get_levels_index(season).get(level)
 
         if not level_config:
             return False, None, "Level not found"
@@ -234,13 +436,26 @@ class BattlePassService:
         if not reward_data:
             return False, None, f"No {tier} reward at level {level}"
 
-        # Mark as claimed
-        claimed = list(progress.claimed_rewards or [])
-        claimed.append(reward_key)
-        progress.claimed_rewards = claimed
-
+        # Mark as claimed with a server-side JSONB append; the containment
+        # guard keeps concurrent claims of the same reward from both succeeding
+        claimed_rewards = func.coalesce(
+            UserBattlePassProgress.claimed_rewards,
+            cast([], JSONB)
+        )
+        result = db.execute(
+            update(UserBattlePassProgress)
+            .where(
+                UserBattlePassProgress.id == progress.id,
+                ~claimed_rewards.contains(cast([reward_key], JSONB))
+            )
+            .values(claimed_rewards=claimed_rewards.op("||")(cast([reward_key], JSONB)))
+            .execution_options(synchronize_session=False)
+        )
         db.commit()
 
+        if result.rowcount == 0:
+            return False, None, "Reward already claimed"
+
         reward = BattlePassReward(**reward_data)
         return True, reward, f"Claimed {reward.name}"
 
@@ -253,8 +468,7 @@ class BattlePassService:
         Activate premium battle pass for user.
         Returns: (success, message)
         """
-        season = self.get_or_create_season(db)
-        progress = self.get_user_progress(db, user_id, season)
+        season, progress = self.get_season_and_progress(db, user_id)
 
         if progress.has_premium:
             return False, "Premium already active"
@@ -263,15 +477,14 @@ class BattlePassService:
         progress.purchase_date = utc_now()
 
         # Also update premium content
-        premium = db.query(UserPremiumContent).filter(
-            UserPremiumContent.user_id == user_id
-        ).first()
+        premium = purchase_service.get_premium_row(db, user_id)
 
         if premium:
             premium.battle_pass_active = True
             premium.battle_pass_expires_at = season.end_date
 
         db.commit()
+        purchase_service.invalidate_premium_cache(user_id)
 
         return True, "Premium Battle Pass activated"
 
@@ -281,22 +494,17 @@ class BattlePassService:
         season: BattlePassSeason
     ) -> UserBattlePassProgressResponse:
         """Convert progress to response format"""
-        levels_config = season.levels_config or generate_levels_config()
-
         # Calculate XP to next level
         next_level_xp = 0
         progress_percent = 100.0
 
         if progress.current_level < season.max_level:
-            current_level_config = next(
-                (l for l in levels_config if l["level"] == progress.current_level),
-                None
-            )
+            current_level_config = self._get_levels_index(season).get(progress.current_level)
             if current_level_config:
                 # Calculate XP into current level
-                xp_before_level = sum(
-                    l["xp_required"] for l in levels_config
-                    if l["level"] < progress.current_level
+                xp_before_level = (
+                    self._get_cum_xp(season)[progress.current_level - 2]
+                    if progress.current_level > 1 else 0
                 )
                 xp_in_level = progress.current_xp - xp_before_level
                 next_level_xp = current_level_config["xp_required"]
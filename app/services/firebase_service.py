@@ -1,10 +1,13 @@
+import asyncio
 import json
 import logging
-from typing import List, Dict, Any, Optional, Union
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from typing import List, Dict, Any, Optional, Tuple, Union
 import firebase_admin
 from firebase_admin import credentials, messaging
 from ..core.config import settings
+from ..utils.time_utils import to_utc_isoformat, utc_now
 from ..models.notification import (
     NotificationRequest, 
     IndividualNotificationRequest, 
@@ -15,6 +18,61 @@ from ..models.notification import (
 
 logger = logging.getLogger(__name__)
 
+# Maximum number of tokens FCM accepts in a single multicast message
+MULTICAST_BATCH_SIZE = 500
+
+# Worker threads for blocking firebase_admin calls, sized to expected FCM concurrency
+FCM_MAX_WORKERS = 32
+
+
+@lru_cache(maxsize=256)
+def _build_message_configs(
+    title: str,
+    body: str,
+    image_url: Optional[str],
+    high_priority: bool
+) -> Tuple[messaging.Notification, messaging.AndroidConfig, messaging.APNSConfig]:
+    """
+    Build the notification, Android and iOS configs for a message.
+    Cached since these are read-only and shared by every message with the same content.
+    """
+    # Create notification object
+    notification = messaging.Notification(
+        title=title,
+        body=body,
+        image=image_url
+    )
+    
+    # Create Android-specific config
+    android_config = messaging.AndroidConfig(
+        priority="high" if high_priority else "normal",
+        notification=messaging.AndroidNotification(
+            title=title,
+            body=body,
+            icon="@mipmap/ic_launcher",
+            color="#4CAF50",  # Snake Classic brand color
+            sound="default",
+            channel_id="snake_classic_notifications"
+        )
+    )
+    
+    # Create iOS-specific config
+    ios_config = messaging.APNSConfig(
+        payload=messaging.APNSPayload(
+            aps=messaging.Aps(
+                alert=messaging.ApsAlert(
+                    title=title,
+                    body=body
+                ),
+                badge=1,
+                sound="default",
+                category="SNAKE_CLASSIC_NOTIFICATION"
+            )
+        )
+    )
+    
+    return notification, android_config, ios_config
+
 
 class FirebaseService:
     """Service for managing Firebase Cloud Messaging operations."""
@@ -22,6 +80,10 @@ class FirebaseService:
     def __init__(self):
         self._initialized = False
         self._app = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=FCM_MAX_WORKERS,
+            thread_name_prefix="fcm"
+        )
         self._initialize_firebase()
     
     def _initialize_firebase(self):
@@ -42,21 +104,17 @@ class FirebaseService:
             logger.error(f"Failed to initialize Firebase Admin SDK: {e}")
             raise
     
-    def _create_message(
-        self, 
+    async def _run_blocking(self, func, *args, **kwargs):
+        """Run a blocking firebase_admin call off the event loop thread."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+    
+    def _build_data_dict(
+        self,
         notification_data: NotificationRequest,
-        token: Optional[str] = None,
-        topic: Optional[str] = None,
-        condition: Optional[str] = None
-    ) -> messaging.Message:
-        """Create FCM message from notification data."""
-        
-        # Create notification object
-        notification = messaging.Notification(
-            title=notification_data.title,
-            body=notification_data.body,
-            image=notification_data.image_url
-        )
+        sent_at: str
+    ) -> Dict[str, str]:
+        """Build the FCM data payload (routing info and metadata) for a notification."""
         
         # Prepare data payload
         data = {}
@@ -74,38 +132,35 @@ class FirebaseService:
         data.update({
             "notification_type": notification_data.notification_type.value,
             "priority": notification_data.priority.value,
-            "sent_at": datetime.utcnow().isoformat()
+            "sent_at": sent_at
         })
         
         # Convert all data values to strings (FCM requirement)
-        data = {k: str(v) for k, v in data.items()}
+        return {k: str(v) for k, v in data.items()}
+    
+    def _create_message(
+        self, 
+        notification_data: NotificationRequest,
+        token: Optional[str] = None,
+        topic: Optional[str] = None,
+        condition: Optional[str] = None,
+        sent_at: Optional[str] = None
+    ) -> messaging.Message:
+        """
+        Create FCM message from notification data.
+        Fan-out callers can pass a precomputed sent_at shared by the whole batch.
+        """
         
-        # Create Android-specific config
-        android_config = messaging.AndroidConfig(
-            priority="high" if notification_data.priority == NotificationPriority.HIGH else "normal",
-            notification=messaging.AndroidNotification(
-                title=notification_data.title,
-                body=notification_data.body,
-                icon="@mipmap/ic_launcher",
-                color="#4CAF50",  # Snake Classic brand color
-                sound="default",
-                channel_id="snake_classic_notifications"
-            )
+        notification, android_config, ios_config = _build_message_configs(
+            notification_data.title,
+            notification_data.body,
+            notification_data.image_url,
+            notification_data.priority == NotificationPriority.HIGH
         )
         
-        # Create iOS-specific config
-        ios_config = messaging.APNSConfig(
-            payload=messaging.APNSPayload(
-                aps=messaging.Aps(
-                    alert=messaging.ApsAlert(
-                        title=notification_data.title,
-                        body=notification_data.body
-                    ),
-                    badge=1,
-                    sound="default",
-                    category="SNAKE_CLASSIC_NOTIFICATION"
-                )
-            )
+        data = self._build_data_dict(
+            notification_data,
+            sent_at or to_utc_isoformat(utc_now())
         )
         
         # Create the message
@@ -130,7 +185,7 @@ class FirebaseService:
             message = self._create_message(request, token=request.fcm_token)
             
             # Send message
-            message_id = messaging.send(message)
+            message_id = await self._run_blocking(messaging.send, message)
             
             logger.info(f"Notification sent successfully to token {request.fcm_token[:10]}...*, message ID: {message_id}")
             
@@ -175,7 +230,7 @@ class FirebaseService:
             )
             
             # Send message
-            message_id = messaging.send(message)
+            message_id = await self._run_blocking(messaging.send, message)
             
             logger.info(f"Notification sent successfully to topic '{request.topic}', message ID: {message_id}")
             
@@ -212,38 +267,56 @@ class FirebaseService:
                     errors=["No tokens provided"]
                 )
             
-            # Create multicast message
-            message = messaging.MulticastMessage(
-                notification=messaging.Notification(
-                    title=notification_data.title,
-                    body=notification_data.body,
-                    image=notification_data.image_url
-                ),
-                data={k: str(v) for k, v in (notification_data.data or {}).items()},
-                tokens=tokens,
-                android=messaging.AndroidConfig(
-                    priority="high" if notification_data.priority == NotificationPriority.HIGH else "normal"
-                )
+            notification, android_config, ios_config = _build_message_configs(
+                notification_data.title,
+                notification_data.body,
+                notification_data.image_url,
+                notification_data.priority == NotificationPriority.HIGH
             )
             
-            # Send multicast message
-            response = messaging.send_multicast(message)
+            # Built once and shared by every chunk
+            data = self._build_data_dict(notification_data, to_utc_isoformat(utc_now()))
+            
+            # FCM accepts at most MULTICAST_BATCH_SIZE tokens per multicast,
+            # so send the chunks concurrently from worker threads
+            chunks = [
+                tokens[i:i + MULTICAST_BATCH_SIZE]
+                for i in range(0, len(tokens), MULTICAST_BATCH_SIZE)
+            ]
+            batch_responses = await asyncio.gather(*(
+                self._run_blocking(
+                    messaging.send_each_for_multicast,
+                    messaging.MulticastMessage(
+                        notification=notification,
+                        data=data,
+                        tokens=chunk,
+                        android=android_config,
+                        apns=ios_config
+                    )
+                )
+                for chunk in chunks
+            ))
+            
+            success_count = sum(r.success_count for r in batch_responses)
+            failure_count = sum(r.failure_count for r in batch_responses)
             
-            logger.info(f"Multicast sent: {response.success_count} successful, {response.failure_count} failed")
+            logger.info(f"Multicast sent: {success_count} successful, {failure_count} failed")
             
-            # Collect error messages
-            errors = []
-            for idx, result in enumerate(response.responses):
-                if not result.success:
-                    error_msg = f"Token {idx}: {result.exception}"
-                    errors.append(error_msg)
-                    logger.warning(error_msg)
+            # Collect error messages (indexes refer to the original token list)
+            errors = [
+                f"Token {batch_idx * MULTICAST_BATCH_SIZE + idx}: {result.exception}"
+                for batch_idx, batch_response in enumerate(batch_responses)
+                for idx, result in enumerate(batch_response.responses)
+                if not result.success
+            ]
+            if errors:
+                logger.warning("Multicast failures: %s", errors)
             
             return NotificationResponse(
-                success=response.failure_count == 0,
-                message=f"Sent to {response.success_count}/{len(tokens)} recipients",
-                success_count=response.success_count,
-                failure_count=response.failure_count,
+                success=failure_count == 0,
+                message=f"Sent to {success_count}/{len(tokens)} recipients",
+                success_count=success_count,
+                failure_count=failure_count,
                 errors=errors if errors else None
             )
             
@@ -265,7 +338,7 @@ class FirebaseService:
             
             token_list = [tokens] if isinstance(tokens, str) else tokens
             
-            response = messaging.subscribe_to_topic(token_list, topic)
+            response = await self._run_blocking(messaging.subscribe_to_topic, token_list, topic)
             
             logger.info(f"Subscribed {len(token_list)} tokens to topic '{topic}'. Success: {response.success_count}, Failed: {response.failure_count}")
             
@@ -293,7 +366,7 @@ class FirebaseService:
             
             token_list = [tokens] if isinstance(tokens, str) else tokens
             
-            response = messaging.unsubscribe_from_topic(token_list, topic)
+            response = await self._run_blocking(messaging.unsubscribe_from_topic, token_list, topic)
             
             logger.info(f"Unsubscribed {len(token_list)} tokens from topic '{topic}'. Success: {response.success_count}, Failed: {response.failure_count}")
             
@@ -327,7 +400,7 @@ class FirebaseService:
             
             # This will validate the token format and existence
             # We'll send a dry run to check validity
-            messaging.send(test_message, dry_run=True)
+            await self._run_blocking(messaging.send, test_message, dry_run=True)
             return True
             
         except messaging.UnregisteredError:
@@ -1,22 +1,42 @@
 """
 Leaderboard service for ranking and leaderboard queries
 """
-from typing import Optional, List, Tuple
+import base64
+from typing import Optional, List, Tuple, Any, Callable
 from uuid import UUID
-from datetime import datetime, timedelta
-from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, and_
-
-from app.models.score import Score
+from sqlalchemy.orm import Session, Query, aliased
+from sqlalchemy import func, desc, and_, or_, tuple_, text, select
+from sqlalchemy.sql.expression import TableClause
+
+from app.models.score import (
+    Score,
+    UserBestScore,
+    LEADERBOARD_VIEW_WINDOWS,
+    weekly_leaderboard_view,
+    daily_leaderboard_view,
+)
 from app.models.user import User
 from app.models.social import Friendship
 from app.schemas.score import LeaderboardEntry, LeaderboardResponse
-from app.utils.time_utils import utc_now
+from app.utils.cache import TTLCache
+
+# Cache lifetime (seconds) for each leaderboard scope
+LEADERBOARD_CACHE_TTLS = {
+    "global": 15 * 60,
+    "weekly": 5 * 60,
+    "daily": 30,
+}
 
 
 class LeaderboardService:
     """Service for leaderboard operations"""
 
+    def __init__(self):
+        # Shared board pages, keyed by (scope, mode, difficulty, page, page_size, cursor)
+        self._board_cache = TTLCache(ttl_seconds=30)
+        # Per-user (rank, score), keyed by (user_id, scope, mode, difficulty)
+        self._rank_cache = TTLCache(ttl_seconds=30, max_size=10000)
+
     def get_global_leaderboard(
         self,
         db: Session,
@@ -24,68 +44,36 @@ class LeaderboardService:
         difficulty: str = "normal",
         page: int = 1,
         page_size: int = 50,
-        current_user_id: Optional[UUID] = None
+        current_user_id: Optional[UUID] = None,
+        cursor: Optional[str] = None
     ) -> LeaderboardResponse:
         """Get global leaderboard - top scores all time"""
-        # Subquery for max score per user
-        subquery = db.query(
-            Score.user_id,
-            func.max(Score.score).label('max_score'),
-            func.max(Score.created_at).label('latest_date')
-        ).filter(
-            Score.game_mode == game_mode,
-            Score.difficulty == difficulty
-        ).group_by(Score.user_id).subquery()
-
-        # Main query joining with users
-        query = db.query(
-            User.id,
-            User.username,
-            User.display_name,
-            User.photo_url,
-            subquery.c.max_score,
-            subquery.c.latest_date
-        ).join(
-            subquery, User.id == subquery.c.user_id
-        ).order_by(desc(subquery.c.max_score))
-
-        # Get total count
-        total_count = query.count()
-
-        # Paginate
-        offset = (page - 1) * page_size
-        results = query.offset(offset).limit(page_size).all()
-
-        # Build entries with rank
-        entries = []
-        for idx, row in enumerate(results):
-            entries.append(LeaderboardEntry(
-                rank=offset + idx + 1,
-                user_id=row[0],
-                username=row[1],
-                display_name=row[2],
-                photo_url=row[3],
-                score=row[4],
-                game_mode=game_mode,
-                difficulty=difficulty,
-                created_at=row[5]
-            ))
-
-        # Get current user's rank and score
-        user_rank = None
-        user_score = None
-        if current_user_id:
-            user_rank, user_score = self._get_user_rank(
-                db, current_user_id, game_mode, difficulty
+        board_key = ("global", game_mode, difficulty, page, page_size, cursor)
+        board = self._board_cache.get(board_key)
+        if board is None:
+            # Best scores are maintained per user on submit, so no aggregation needed
+            query = db.query(
+                User.id,
+                User.username,
+                User.display_name,
+                User.photo_url,
+                UserBestScore.best_score,
+                UserBestScore.achieved_at
+            ).join(
+                UserBestScore, User.id == UserBestScore.user_id
+            ).filter(
+                UserBestScore.game_mode == game_mode,
+                UserBestScore.difficulty == difficulty
             )
+            board = self._build_board(
+                query, UserBestScore.best_score, game_mode, difficulty, page, page_size, cursor
+            )
+            self._board_cache.set(board_key, board, LEADERBOARD_CACHE_TTLS["global"])
 
-        return LeaderboardResponse(
-            entries=entries,
-            total_count=total_count,
-            page=page,
-            page_size=page_size,
-            user_rank=user_rank,
-            user_score=user_score
+        # Get current user's rank and score
+        return self._with_user_rank(
+            board, "global", current_user_id, game_mode, difficulty,
+            lambda: self._get_user_rank(db, current_user_id, game_mode, difficulty)
         )
 
     def get_weekly_leaderboard(
@@ -95,12 +83,13 @@ class LeaderboardService:
         difficulty: str = "normal",
         page: int = 1,
         page_size: int = 50,
-        current_user_id: Optional[UUID] = None
+        current_user_id: Optional[UUID] = None,
+        cursor: Optional[str] = None
     ) -> LeaderboardResponse:
         """Get weekly leaderboard - top scores this week"""
-        week_ago = utc_now() - timedelta(days=7)
         return self._get_time_filtered_leaderboard(
-            db, game_mode, difficulty, week_ago, page, page_size, current_user_id
+            db, game_mode, difficulty, "weekly", weekly_leaderboard_view,
+            page, page_size, current_user_id, cursor
         )
 
     def get_daily_leaderboard(
@@ -110,12 +99,13 @@ class LeaderboardService:
         difficulty: str = "normal",
         page: int = 1,
         page_size: int = 50,
-        current_user_id: Optional[UUID] = None
+        current_user_id: Optional[UUID] = None,
+        cursor: Optional[str] = None
     ) -> LeaderboardResponse:
         """Get daily leaderboard - top scores today"""
-        today_start = utc_now().replace(hour=0, minute=0, second=0, microsecond=0)
         return self._get_time_filtered_leaderboard(
-            db, game_mode, difficulty, today_start, page, page_size, current_user_id
+            db, game_mode, difficulty, "daily", daily_leaderboard_view,
+            page, page_size, current_user_id, cursor
         )
 
     def get_friends_leaderboard(
@@ -125,74 +115,59 @@ class LeaderboardService:
         game_mode: str = "classic",
         difficulty: str = "normal",
         page: int = 1,
-        page_size: int = 50
+        page_size: int = 50,
+        cursor: Optional[str] = None
     ) -> LeaderboardResponse:
         """Get leaderboard for user's friends"""
-        # Get friend IDs
-        friend_ids = db.query(Friendship.friend_id).filter(
+        # Accepted friends, resolved inside the leaderboard query
+        friend_ids = select(Friendship.friend_id).where(
             Friendship.user_id == user_id,
             Friendship.status == "accepted"
-        ).all()
-        friend_ids = [f[0] for f in friend_ids]
-        friend_ids.append(user_id)  # Include self
+        )
 
-        # Subquery for max score per user among friends
-        subquery = db.query(
+        # Best score and rank per user among friends (and self)
+        friend_scores = db.query(
             Score.user_id,
             func.max(Score.score).label('max_score'),
-            func.max(Score.created_at).label('latest_date')
+            func.max(Score.created_at).label('latest_date'),
+            func.rank().over(order_by=desc(func.max(Score.score))).label('rank')
         ).filter(
-            Score.user_id.in_(friend_ids),
+            or_(Score.user_id == user_id, Score.user_id.in_(friend_ids)),
             Score.game_mode == game_mode,
             Score.difficulty == difficulty
-        ).group_by(Score.user_id).subquery()
+        ).group_by(Score.user_id).cte('friend_scores')
 
-        # Main query
+        # Caller's rank and score ride along on every row of the page
+        own_row = friend_scores.c.user_id == user_id
         query = db.query(
             User.id,
             User.username,
             User.display_name,
             User.photo_url,
-            subquery.c.max_score,
-            subquery.c.latest_date
+            friend_scores.c.max_score,
+            friend_scores.c.latest_date,
+            select(friend_scores.c.rank).where(own_row).scalar_subquery().label('user_rank'),
+            select(friend_scores.c.max_score).where(own_row).scalar_subquery().label('user_score')
         ).join(
-            subquery, User.id == subquery.c.user_id
-        ).order_by(desc(subquery.c.max_score))
+            friend_scores, User.id == friend_scores.c.user_id
+        )
 
-        total_count = query.count()
-        offset = (page - 1) * page_size
-        results = query.offset(offset).limit(page_size).all()
+        results, offset, total_count, has_more, next_cursor = self._fetch_page(
+            query, friend_scores.c.max_score, page, page_size, cursor
+        )
 
-        entries = []
-        for idx, row in enumerate(results):
-            entries.append(LeaderboardEntry(
-                rank=offset + idx + 1,
-                user_id=row[0],
-                username=row[1],
-                display_name=row[2],
-                photo_url=row[3],
-                score=row[4],
-                game_mode=game_mode,
-                difficulty=difficulty,
-                created_at=row[5]
-            ))
+        entries = self._build_entries(results, offset, game_mode, difficulty)
 
         # Get user's rank within friends
-        user_rank = None
-        user_score = None
-        user_high = db.query(func.max(Score.score)).filter(
-            Score.user_id == user_id,
-            Score.game_mode == game_mode,
-            Score.difficulty == difficulty
-        ).scalar()
+        if results:
+            user_rank, user_score = results[0].user_rank, results[0].user_score
+        else:
+            # Empty page: look the caller up directly
+            own = db.query(friend_scores.c.rank, friend_scores.c.max_score).filter(own_row).first()
+            user_rank, user_score = own if own else (None, None)
 
-        if user_high:
-            user_score = user_high
-            # Count friends with higher scores
-            higher_count = db.query(func.count()).select_from(subquery).filter(
-                subquery.c.max_score > user_high
-            ).scalar()
-            user_rank = (higher_count or 0) + 1
+        if not user_score:
+            user_rank, user_score = None, None
 
         return LeaderboardResponse(
             entries=entries,
@@ -200,7 +175,9 @@ class LeaderboardService:
             page=page,
             page_size=page_size,
             user_rank=user_rank,
-            user_score=user_score
+            user_score=user_score,
+            next_cursor=next_cursor,
+            has_more=has_more
         )
 
     def _get_time_filtered_leaderboard(
@@ -208,42 +185,172 @@ class LeaderboardService:
         db: Session,
         game_mode: str,
         difficulty: str,
-        since: datetime,
+        scope: str,
+        view: TableClause,
         page: int,
         page_size: int,
-        current_user_id: Optional[UUID]
+        current_user_id: Optional[UUID],
+        cursor: Optional[str] = None
     ) -> LeaderboardResponse:
-        """Get leaderboard filtered by time"""
-        # Subquery for max score per user within timeframe
-        subquery = db.query(
-            Score.user_id,
-            func.max(Score.score).label('max_score'),
-            func.max(Score.created_at).label('latest_date')
-        ).filter(
-            Score.game_mode == game_mode,
-            Score.difficulty == difficulty,
-            Score.created_at >= since
-        ).group_by(Score.user_id).subquery()
+        """Get leaderboard from a time-windowed materialized view"""
+        board_key = (scope, game_mode, difficulty, page, page_size, cursor)
+        board = self._board_cache.get(board_key)
+        if board is None:
+            # Main query against the view's per-user best scores
+            query = db.query(
+                User.id,
+                User.username,
+                User.display_name,
+                User.photo_url,
+                view.c.max_score,
+                view.c.latest_date
+            ).join(
+                view, User.id == view.c.user_id
+            ).filter(
+                view.c.game_mode == game_mode,
+                view.c.difficulty == difficulty
+            )
+            board = self._build_board(
+                query, view.c.max_score, game_mode, difficulty, page, page_size, cursor
+            )
+            self._board_cache.set(board_key, board, LEADERBOARD_CACHE_TTLS[scope])
 
-        # Main query
-        query = db.query(
-            User.id,
-            User.username,
-            User.display_name,
-            User.photo_url,
-            subquery.c.max_score,
-            subquery.c.latest_date
-        ).join(
-            subquery, User.id == subquery.c.user_id
-        ).order_by(desc(subquery.c.max_score))
+        # Get current user's rank
+        return self._with_user_rank(
+            board, scope, current_user_id, game_mode, difficulty,
+            lambda: self._get_view_user_rank(db, view, current_user_id, game_mode, difficulty)
+        )
 
-        total_count = query.count()
-        offset = (page - 1) * page_size
-        results = query.offset(offset).limit(page_size).all()
+    def invalidate_user_rank(self, user_id: UUID, game_mode: str, difficulty: str) -> None:
+        """Drop a user's cached ranks after they submit a score"""
+        for scope in LEADERBOARD_CACHE_TTLS:
+            self._rank_cache.delete((user_id, scope, game_mode, difficulty))
 
-        entries = []
-        for idx, row in enumerate(results):
-            entries.append(LeaderboardEntry(
+    def _build_board(
+        self,
+        query: Query,
+        max_score_col: Any,
+        game_mode: str,
+        difficulty: str,
+        page: int,
+        page_size: int,
+        cursor: Optional[str]
+    ) -> LeaderboardResponse:
+        """Fetch a page and build the shared (not user-specific) response"""
+        results, offset, total_count, has_more, next_cursor = self._fetch_page(
+            query, max_score_col, page, page_size, cursor
+        )
+
+        return LeaderboardResponse(
+            entries=self._build_entries(results, offset, game_mode, difficulty),
+            total_count=total_count,
+            page=page,
+            page_size=page_size,
+            next_cursor=next_cursor,
+            has_more=has_more
+        )
+
+    def _with_user_rank(
+        self,
+        board: LeaderboardResponse,
+        scope: str,
+        user_id: Optional[UUID],
+        game_mode: str,
+        difficulty: str,
+        rank_fn: Callable[[], Tuple[Optional[int], Optional[int]]]
+    ) -> LeaderboardResponse:
+        """Attach the user's (cached) rank and score to a shared board"""
+        if not user_id:
+            return board
+
+        rank_key = (user_id, scope, game_mode, difficulty)
+        rank = self._rank_cache.get(rank_key)
+        if rank is None:
+            rank = rank_fn()
+            self._rank_cache.set(rank_key, rank, LEADERBOARD_CACHE_TTLS[scope])
+
+        user_rank, user_score = rank
+        return board.model_copy(update={"user_rank": user_rank, "user_score": user_score})
+
+    def refresh_leaderboard_view(self, db: Session, view_name: str) -> None:
+        """Refresh a leaderboard materialized view without blocking readers"""
+        if view_name not in LEADERBOARD_VIEW_WINDOWS:
+            raise ValueError(f"Unknown leaderboard view: {view_name}")
+        db.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view_name}"))
+        db.commit()
+
+    def _fetch_page(
+        self,
+        query: Query,
+        max_score_col: Any,
+        page: int,
+        page_size: int,
+        cursor: Optional[str]
+    ) -> Tuple[List[Any], int, int, bool, Optional[str]]:
+        """
+        Fetch one leaderboard page ordered by (max_score, user_id) descending.
+        Seeks past the cursor when given, otherwise falls back to OFFSET paging.
+        The total count comes from a COUNT(*) OVER () window in the same query.
+        Returns: (rows, offset, total_count, has_more, next_cursor)
+        """
+        count_query = query
+        query = query.add_columns(
+            func.count().over().label('total_count')
+        ).order_by(desc(max_score_col), desc(User.id))
+
+        if cursor:
+            cursor_score, cursor_user_id, offset = self._decode_cursor(cursor)
+            query = query.filter(
+                tuple_(max_score_col, User.id) < tuple_(cursor_score, cursor_user_id)
+            )
+        else:
+            offset = (page - 1) * page_size
+            query = query.offset(offset)
+
+        # Fetch one extra row to know whether another page exists
+        rows = query.limit(page_size + 1).all()
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+
+        # The window counts rows past the cursor/offset filter, so add back
+        # the rows before this page. Only a page past the end needs a COUNT.
+        if rows:
+            total_count = offset + rows[0].total_count if cursor else rows[0].total_count
+        elif offset:
+            total_count = count_query.count()
+        else:
+            total_count = 0
+
+        next_cursor = None
+        if has_more:
+            last = rows[-1]
+            next_cursor = self._encode_cursor(last[4], last[0], offset + len(rows))
+
+        return rows, offset, total_count, has_more, next_cursor
+
+    def _encode_cursor(self, score: int, user_id: UUID, rank: int) -> str:
+        """Encode the last row of a page as an opaque cursor"""
+        raw = f"{score}:{user_id}:{rank}"
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def _decode_cursor(self, cursor: str) -> Tuple[int, UUID, int]:
+        """Decode a cursor into (score, user_id, rank of that row)"""
+        try:
+            score, user_id, rank = base64.urlsafe_b64decode(cursor.encode()).decode().split(":")
+            return int(score), UUID(user_id), int(rank)
+        except ValueError:
+            raise ValueError("Invalid leaderboard cursor")
+
+    def _build_entries(
+        self,
+        rows: List[Any],
+        offset: int,
+        game_mode: str,
+        difficulty: str
+    ) -> List[LeaderboardEntry]:
+        """Build leaderboard entries with rank from result rows"""
+        return [
+            LeaderboardEntry(
                 rank=offset + idx + 1,
                 user_id=row[0],
                 username=row[1],
@@ -253,33 +360,9 @@ class LeaderboardService:
                 game_mode=game_mode,
                 difficulty=difficulty,
                 created_at=row[5]
-            ))
-
-        # Get current user's rank
-        user_rank = None
-        user_score = None
-        if current_user_id:
-            user_high = db.query(func.max(Score.score)).filter(
-                Score.user_id == current_user_id,
-                Score.game_mode == game_mode,
-                Score.difficulty == difficulty,
-                Score.created_at >= since
-            ).scalar()
-            if user_high:
-                user_score = user_high
-                higher_count = db.query(func.count()).select_from(subquery).filter(
-                    subquery.c.max_score > user_high
-                ).scalar()
-                user_rank = (higher_count or 0) + 1
-
-        return LeaderboardResponse(
-            entries=entries,
-            total_count=total_count,
-            page=page,
-            page_size=page_size,
-            user_rank=user_rank,
-            user_score=user_score
-        )
+            )
+            for idx, row in enumerate(rows)
+        ]
 
     def _get_user_rank(
         self,
@@ -288,31 +371,51 @@ class LeaderboardService:
         game_mode: str,
         difficulty: str
     ) -> Tuple[Optional[int], Optional[int]]:
-        """Get user's rank and high score"""
-        # Get user's high score
-        user_high = db.query(func.max(Score.score)).filter(
-            Score.user_id == user_id,
-            Score.game_mode == game_mode,
-            Score.difficulty == difficulty
-        ).scalar()
-
-        if not user_high:
+        """Get user's rank and high score in a single round trip"""
+        other = aliased(UserBestScore)
+        higher_count = select(func.count()).select_from(other).where(
+            other.game_mode == UserBestScore.game_mode,
+            other.difficulty == UserBestScore.difficulty,
+            other.best_score > UserBestScore.best_score
+        ).correlate(UserBestScore).scalar_subquery()
+
+        row = db.query(UserBestScore.best_score, higher_count).filter(
+            UserBestScore.user_id == user_id,
+            UserBestScore.game_mode == game_mode,
+            UserBestScore.difficulty == difficulty
+        ).first()
+
+        if not row or not row[0]:
             return None, None
 
-        # Count users with higher scores
-        subquery = db.query(
-            Score.user_id,
-            func.max(Score.score).label('max_score')
-        ).filter(
-            Score.game_mode == game_mode,
-            Score.difficulty == difficulty
-        ).group_by(Score.user_id).subquery()
+        return (row[1] or 0) + 1, row[0]
 
-        higher_count = db.query(func.count()).select_from(subquery).filter(
-            subquery.c.max_score > user_high
-        ).scalar()
+    def _get_view_user_rank(
+        self,
+        db: Session,
+        view: TableClause,
+        user_id: UUID,
+        game_mode: str,
+        difficulty: str
+    ) -> Tuple[Optional[int], Optional[int]]:
+        """Get user's rank and high score within a leaderboard view in a single round trip"""
+        mine = view.alias("mine")
+        higher_count = select(func.count()).select_from(view).where(
+            view.c.game_mode == mine.c.game_mode,
+            view.c.difficulty == mine.c.difficulty,
+            view.c.max_score > mine.c.max_score
+        ).correlate(mine).scalar_subquery()
+
+        row = db.query(mine.c.max_score, higher_count).filter(
+            mine.c.user_id == user_id,
+            mine.c.game_mode == game_mode,
+            mine.c.difficulty == difficulty
+        ).first()
+
+        if not row or not row[0]:
+            return None, None
 
-        return (higher_count or 0) + 1, user_high
+        return (row[1] or 0) + 1, row[0]
 
 
 leaderboard_service = LeaderboardService()
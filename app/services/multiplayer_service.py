@@ -1,15 +1,22 @@
 """
 Multiplayer game service for managing real-time games
 """
+import itertools
+import logging
 import random
-import string
+import secrets
+import time
 import asyncio
-from typing import Optional, List, Dict, Set
+from collections import deque
+from typing import Optional, List, Dict, Set, Tuple, Deque, Final
 from uuid import UUID, uuid4
 from datetime import datetime
 from dataclasses import dataclass, field
+from sqlalchemy import update, values, column, Integer, Boolean, String
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID, JSONB
 from sqlalchemy.orm import Session
 
+from app.database import SessionLocal
 from app.models.multiplayer import MultiplayerGame, MultiplayerPlayer
 from app.models.user import User
 from app.schemas.multiplayer import (
@@ -20,6 +27,27 @@ from app.schemas.multiplayer import (
 )
 from app.utils.time_utils import utc_now
 
+logger = logging.getLogger(__name__)
+
+# Movement per direction as (dx, dy), and the reverse of each direction
+DIR_DELTAS: Final = {"up": (0, -1), "down": (0, 1), "left": (-1, 0), "right": (1, 0)}
+OPPOSITES: Final = {"up": "down", "down": "up", "left": "right", "right": "left"}
+
+# Room codes: 6 Crockford base32 characters (no I, L, O or U) = 30 bits
+ROOM_CODE_ALPHABET: Final = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+ROOM_CODE_LENGTH: Final = 6
+ROOM_CODE_BITS: Final = 5 * ROOM_CODE_LENGTH
+# Characters users commonly type for their look-alikes
+ROOM_CODE_CONFUSABLES: Final = str.maketrans("OIL", "011")
+
+# Random picks tried before _spawn_food scans for a free cell
+FOOD_SPAWN_QUICK_TRIES = 8
+
+# Maximum number of queued DB writes flushed in one transaction
+WRITE_BATCH_SIZE = 100
+
+# Seconds between durable snapshots of games that changed since the last one
+SNAPSHOT_INTERVAL_SECONDS = 5
 
 # Player colors
 PLAYER_COLORS = [
@@ -34,6 +62,63 @@ PLAYER_COLORS = [
 ]
 
 
+def advance_snakes(
+    snakes: List[Tuple[UUID, Deque[int], int]],
+    occupied: Dict[int, Tuple[str, object]],
+    grid_size: int
+) -> Tuple[List[UUID], List[Tuple[UUID, int]]]:
+    """Advance live snakes one cell each, in order.
+
+    ``snakes`` holds (user_id, packed body, cell delta) per live snake. Bodies
+    and the occupancy map are updated in place. Returns the ids of snakes that
+    crashed and the (user_id, cell) of every food eaten.
+    """
+    cell_count = grid_size * grid_size
+    crashed: List[UUID] = []
+    eaten: List[Tuple[UUID, int]] = []
+
+    for user_id, body, delta in snakes:
+        head = body[0]
+        new_cell = head + delta
+
+        # Wall: off the top/bottom, or a horizontal move that changed rows
+        if not 0 <= new_cell < cell_count or \
+           (delta in (-1, 1) and new_cell // grid_size != head // grid_size):
+            crashed.append(user_id)
+            continue
+
+        # Any snake body, including its own
+        hit = occupied.get(new_cell)
+        if hit is not None and hit[0] == "body":
+            crashed.append(user_id)
+            continue
+
+        body.appendleft(new_cell)
+        occupied[new_cell] = ("body", user_id)
+
+        if hit is not None:
+            eaten.append((user_id, new_cell))
+        else:
+            occupied.pop(body.pop(), None)
+
+    return crashed, eaten
+
+
+@dataclass
+class GameStatusWrite:
+    """Queued status update for a MultiplayerGame row"""
+    game_id: str
+    status: str
+    finished_at: Optional[datetime] = None
+    food_positions: Optional[List[Dict[str, int]]] = None
+
+
+@dataclass
+class PlayerSnapshotWrite:
+    """Queued snapshot of player rows: (game db id, user id, score, is_alive, direction, snake_positions)"""
+    rows: List[Tuple[UUID, UUID, int, bool, str, List[Dict[str, int]]]]
+
+
 @dataclass
 class ActiveGame:
     """In-memory game state for active games"""
@@ -45,7 +130,13 @@ class ActiveGame:
     grid_size: int = 20
     speed: int = 100
     players: Dict[UUID, PlayerState] = field(default_factory=dict)
+    # Snake bodies as packed cells (y * grid_size + x), head first. These are
+    # authoritative during play; PlayerState.snake_positions is refreshed from
+    # them only when state is serialized.
+    bodies: Dict[UUID, Deque[int]] = field(default_factory=dict)
     food_positions: List[Position] = field(default_factory=list)
+    # Packed cell -> index into food_positions
+    food_index: Dict[int, int] = field(default_factory=dict)
     power_ups: List[Dict] = field(default_factory=list)
     countdown: Optional[int] = None
     winner_id: Optional[UUID] = None
@@ -53,6 +144,18 @@ class ActiveGame:
     created_at: datetime = field(default_factory=utc_now)
     started_at: Optional[datetime] = None
     game_loop_task: Optional[asyncio.Task] = None
+    # Last game_state payload broadcast, to skip identical repeats
+    last_broadcast: Optional[str] = field(default=None, repr=False)
+    # monotonic() of the first tick since the last snapshot, None when clean
+    dirty_since: Optional[float] = None
+    # Packed-cell offset per direction, derived from grid_size
+    cell_deltas: Dict[str, int] = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.cell_deltas = {
+            direction: dy * self.grid_size + dx
+            for direction, (dx, dy) in DIR_DELTAS.items()
+        }
 
 
 class MultiplayerService:
@@ -65,34 +168,251 @@ class MultiplayerService:
         self.user_to_game: Dict[UUID, str] = {}
         # WebSocket connections per game
         self.game_connections: Dict[str, Set] = {}
+        # Room codes are a keyed permutation of a counter: unique without retries
+        self._room_seq = itertools.count(secrets.randbelow(1 << ROOM_CODE_BITS))
+        self._room_keys = [secrets.randbits(ROOM_CODE_BITS // 2) for _ in range(4)]
+        # Background writer for DB updates that the game flow doesn't wait on
+        self._write_queue: Optional[asyncio.Queue] = None
+        self._writer_task: Optional[asyncio.Task] = None
+        self._snapshot_task: Optional[asyncio.Task] = None
+
+    def _ensure_background_tasks(self, loop: asyncio.AbstractEventLoop):
+        """Start the writer and snapshot tasks on this loop if they aren't running"""
+        if self._writer_task is None or self._writer_task.done():
+            self._write_queue = asyncio.Queue()
+            self._writer_task = loop.create_task(self._writer_loop())
+        if self._snapshot_task is None or self._snapshot_task.done():
+            self._snapshot_task = loop.create_task(self._snapshot_loop())
+
+    def _enqueue_write(self, record):
+        """Queue a MultiplayerPlayer insert or a *Write record for the background writer.
+
+        Outside a running event loop the record is written immediately.
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._flush_writes([record])
+            return
 
-    def _generate_room_code(self) -> str:
-        """Generate a unique room code"""
+        self._ensure_background_tasks(loop)
+        self._write_queue.put_nowait(record)
+
+    def _snapshot(self, games: List[ActiveGame]) -> PlayerSnapshotWrite:
+        """Capture player rows for the given games and mark them clean"""
+        rows = []
+        for game in games:
+            grid_size = game.grid_size
+            for user_id, player in game.players.items():
+                body = game.bodies.get(user_id, ())
+                rows.append((
+                    game.db_id,
+                    user_id,
+                    player.score,
+                    player.is_alive,
+                    player.direction,
+                    [{"x": cell % grid_size, "y": cell // grid_size} for cell in body]
+                ))
+            game.dirty_since = None
+        return PlayerSnapshotWrite(rows=rows)
+
+    def _snapshot_dirty_games(self):
+        """Queue one snapshot covering every game changed since the last one"""
+        dirty = [g for g in self.active_games.values() if g.dirty_since is not None]
+        if dirty:
+            self._enqueue_write(self._snapshot(dirty))
+
+    async def _snapshot_loop(self):
+        """Periodically snapshot changed games for crash recovery"""
         while True:
-            code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
-            if code not in self.room_code_to_game:
-                return code
-
-    def _spawn_food(self, game: ActiveGame) -> Position:
-        """Spawn food at a random valid position"""
-        occupied = set()
-        for player in game.players.values():
-            for pos in player.snake_positions:
-                occupied.add((pos.x, pos.y))
-        for food in game.food_positions:
-            occupied.add((food.x, food.y))
-
-        attempts = 0
-        while attempts < 100:
-            x = random.randint(0, game.grid_size - 1)
-            y = random.randint(0, game.grid_size - 1)
-            if (x, y) not in occupied:
-                return Position(x=x, y=y)
-            attempts += 1
-
-        # Fallback - just pick random spot
-        return Position(x=random.randint(0, game.grid_size - 1),
-                       y=random.randint(0, game.grid_size - 1))
+            await asyncio.sleep(SNAPSHOT_INTERVAL_SECONDS)
+            try:
+                self._snapshot_dirty_games()
+            except Exception as e:
+                logger.error(f"Failed to snapshot multiplayer games: {e}")
+
+    async def _writer_loop(self):
+        """Drain the write queue in batches, committing each batch off the event loop"""
+        while True:
+            batch = [await self._write_queue.get()]
+            while len(batch) < WRITE_BATCH_SIZE and not self._write_queue.empty():
+                batch.append(self._write_queue.get_nowait())
+            await asyncio.to_thread(self._flush_writes, batch)
+
+    def _flush_writes(self, batch: List):
+        """Persist a batch of queued writes in a single transaction"""
+        db = SessionLocal()
+        try:
+            players = [r for r in batch if isinstance(r, MultiplayerPlayer)]
+            if players:
+                db.bulk_save_objects(players)
+
+            # Later snapshots of the same player win
+            snapshot_rows = {}
+            for record in batch:
+                if isinstance(record, GameStatusWrite):
+                    changes = {"status": record.status}
+                    if record.finished_at is not None:
+                        changes["finished_at"] = record.finished_at
+                    if record.food_positions is not None:
+                        changes["food_positions"] = record.food_positions
+                    db.query(MultiplayerGame).filter(
+                        MultiplayerGame.game_id == record.game_id
+                    ).update(changes, synchronize_session=False)
+                elif isinstance(record, PlayerSnapshotWrite):
+                    for row in record.rows:
+                        snapshot_rows[(row[0], row[1])] = row
+
+            if snapshot_rows:
+                snap = values(
+                    column("game_id", PG_UUID(as_uuid=True)),
+                    column("user_id", PG_UUID(as_uuid=True)),
+                    column("score", Integer),
+                    column("is_alive", Boolean),
+                    column("direction", String),
+                    column("snake_positions", JSONB),
+                    name="snap"
+                ).data(list(snapshot_rows.values()))
+
+                db.execute(
+                    update(MultiplayerPlayer)
+                    .where(
+                        MultiplayerPlayer.game_id == snap.c.game_id,
+                        MultiplayerPlayer.user_id == snap.c.user_id
+                    )
+                    .values(
+                        score=snap.c.score,
+                        is_alive=snap.c.is_alive,
+                        direction=snap.c.direction,
+                        snake_positions=snap.c.snake_positions,
+                        last_update_at=utc_now()
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to persist {len(batch)} multiplayer writes: {e}")
+        finally:
+            db.close()
+
+    async def stop_writer(self):
+        """Stop the background writer and flush anything still queued"""
+        if self._snapshot_task is not None:
+            self._snapshot_task.cancel()
+            self._snapshot_task = None
+
+        if self._writer_task is None:
+            return
+
+        # Take a last snapshot so it lands in the final flush
+        self._snapshot_dirty_games()
+
+        self._writer_task.cancel()
+        try:
+            await self._writer_task
+        except asyncio.CancelledError:
+            pass
+        self._writer_task = None
+
+        pending = []
+        while not self._write_queue.empty():
+            pending.append(self._write_queue.get_nowait())
+        if pending:
+            await asyncio.to_thread(self._flush_writes, pending)
+
+    def _generate_room_code(self) -> str:
+        """Generate a unique room code.
+
+        The next counter value is scrambled with a small Feistel network so
+        codes are unpredictable but never repeat within 2**30 games.
+        """
+        half_bits = ROOM_CODE_BITS // 2
+        mask = (1 << half_bits) - 1
+        n = next(self._room_seq) & ((1 << ROOM_CODE_BITS) - 1)
+
+        left, right = n >> half_bits, n & mask
+        for key in self._room_keys:
+            left, right = right, left ^ ((((right ^ key) * 0x2545F491) >> 7) & mask)
+        n = (left << half_bits) | right
+
+        chars = []
+        for _ in range(ROOM_CODE_LENGTH):
+            n, digit = divmod(n, 32)
+            chars.append(ROOM_CODE_ALPHABET[digit])
+        return ''.join(reversed(chars))
+
+    def _build_occupancy(self, game: ActiveGame) -> Dict[int, Tuple[str, object]]:
+        """Map every occupied packed cell to ('body', user_id) or ('food', None)"""
+        occupied: Dict[int, Tuple[str, object]] = {}
+        for user_id, body in game.bodies.items():
+            for cell in body:
+                occupied[cell] = ("body", user_id)
+        for cell in game.food_index:
+            occupied[cell] = ("food", None)
+        return occupied
+
+    def _add_food(self, game: ActiveGame, food: Position):
+        """Append food and index it by cell"""
+        game.food_index[food.pack(game.grid_size)] = len(game.food_positions)
+        game.food_positions.append(food)
+
+    def _remove_food(self, game: ActiveGame, cell: int) -> bool:
+        """Swap-remove the food at a cell. Returns False if there was none."""
+        idx = game.food_index.pop(cell, None)
+        if idx is None:
+            return False
+
+        last = game.food_positions.pop()
+        if idx < len(game.food_positions):
+            game.food_positions[idx] = last
+            game.food_index[last.pack(game.grid_size)] = idx
+        return True
+
+    def _sync_snake_positions(self, game: ActiveGame):
+        """Refresh each PlayerState's snake_positions from the packed bodies"""
+        grid_size = game.grid_size
+        for user_id, player in game.players.items():
+            body = game.bodies.get(user_id)
+            if body is not None:
+                player.snake_positions = [Position.unpack(cell, grid_size) for cell in body]
+
+    def _spawn_food(
+        self,
+        game: ActiveGame,
+        occupied: Optional[Dict[int, Tuple[str, object]]] = None
+    ) -> Optional[Position]:
+        """Spawn food on a random free cell, or return None if the grid is full.
+
+        Pass the tick's occupancy map to avoid rebuilding it; the new food
+        cell is recorded in it.
+        """
+        if occupied is None:
+            occupied = self._build_occupancy(game)
+
+        grid_size = game.grid_size
+        cell_count = grid_size * grid_size
+        free_count = cell_count - len(occupied)
+        if free_count <= 0:
+            return None
+
+        # A few blind picks are enough on a sparse grid
+        for _ in range(FOOD_SPAWN_QUICK_TRIES):
+            cell = random.randrange(cell_count)
+            if cell not in occupied:
+                break
+        else:
+            # Crowded grid: take the k-th free cell directly
+            k = random.randrange(free_count)
+            for cell in range(cell_count):
+                if cell not in occupied:
+                    if k == 0:
+                        break
+                    k -= 1
+
+        occupied[cell] = ("food", None)
+        return Position.unpack(cell, grid_size)
 
     def create_game(
         self,
@@ -101,9 +421,13 @@ class MultiplayerService:
         mode: str = "classic",
         max_players: int = 4,
         grid_size: int = 20,
-        speed: int = 100
+        speed: int = 100,
+        user: Optional[User] = None
     ) -> ActiveGame:
-        """Create a new multiplayer game"""
+        """Create a new multiplayer game.
+
+        Pass the already-loaded ``user`` to skip re-fetching it.
+        """
         # Check if user already in a game
         if user_id in self.user_to_game:
             old_game_id = self.user_to_game[user_id]
@@ -144,7 +468,7 @@ class MultiplayerService:
         self.game_connections[game_id] = set()
 
         # Add creator as first player
-        self._add_player_to_game(db, game, user_id, 0)
+        self._add_player_to_game(db, game, user_id, 0, user)
 
         return game
 
@@ -152,10 +476,13 @@ class MultiplayerService:
         self,
         db: Session,
         user_id: UUID,
-        room_code: str
+        room_code: str,
+        user: Optional[User] = None
     ) -> tuple[ActiveGame, int]:
         """Join a game by room code. Returns (game, player_index)"""
-        game_id = self.room_code_to_game.get(room_code.upper())
+        game_id = self.room_code_to_game.get(
+            room_code.upper().translate(ROOM_CODE_CONFUSABLES)
+        )
         if not game_id:
             raise ValueError("Game not found")
 
@@ -180,7 +507,7 @@ class MultiplayerService:
                 self.leave_game(db, user_id, old_game_id)
 
         player_index = len(game.players)
-        self._add_player_to_game(db, game, user_id, player_index)
+        self._add_player_to_game(db, game, user_id, player_index, user)
 
         return game, player_index
 
@@ -189,10 +516,13 @@ class MultiplayerService:
         db: Session,
         game: ActiveGame,
         user_id: UUID,
-        player_index: int
+        player_index: int,
+        user: Optional[User] = None
     ):
         """Add a player to a game"""
-        user = db.query(User).filter(User.id == user_id).first()
+        if user is None:
+            # Primary-key lookup; served from the identity map when possible
+            user = db.get(User, user_id)
 
         # Calculate starting position
         start_positions = [
@@ -216,9 +546,10 @@ class MultiplayerService:
         )
 
         game.players[user_id] = player_state
+        game.bodies[user_id] = deque([start_y * game.grid_size + start_x])
         self.user_to_game[user_id] = game.game_id
 
-        # Save to database
+        # Save to database in the background
         db_player = MultiplayerPlayer(
             game_id=game.db_id,
             user_id=user_id,
@@ -228,8 +559,7 @@ class MultiplayerService:
             snake_positions=[{"x": start_x, "y": start_y}],
             direction="right"
         )
-        db.add(db_player)
-        db.commit()
+        self._enqueue_write(db_player)
 
     def leave_game(self, db: Session, user_id: UUID, game_id: str):
         """Remove a player from a game"""
@@ -239,6 +569,7 @@ class MultiplayerService:
 
         if user_id in game.players:
             del game.players[user_id]
+        game.bodies.pop(user_id, None)
 
         if user_id in self.user_to_game:
             del self.user_to_game[user_id]
@@ -258,12 +589,7 @@ class MultiplayerService:
             game.game_loop_task.cancel()
 
         # Update database
-        db_game = db.query(MultiplayerGame).filter(
-            MultiplayerGame.game_id == game_id
-        ).first()
-        if db_game:
-            db_game.status = "finished"
-            db.commit()
+        self._enqueue_write(GameStatusWrite(game_id=game_id, status="finished"))
 
         # Remove from memory
         if game.room_code in self.room_code_to_game:
@@ -289,17 +615,18 @@ class MultiplayerService:
         game.countdown = 3
 
         # Spawn initial food
+        occupied = self._build_occupancy(game)
         for _ in range(3):
-            game.food_positions.append(self._spawn_food(game))
+            food = self._spawn_food(game, occupied)
+            if food is not None:
+                self._add_food(game, food)
 
         # Update database
-        db_game = db.query(MultiplayerGame).filter(
-            MultiplayerGame.game_id == game_id
-        ).first()
-        if db_game:
-            db_game.status = "countdown"
-            db_game.food_positions = [{"x": f.x, "y": f.y} for f in game.food_positions]
-            db.commit()
+        self._enqueue_write(GameStatusWrite(
+            game_id=game_id,
+            status="countdown",
+            food_positions=[{"x": f.x, "y": f.y} for f in game.food_positions]
+        ))
 
         return True
 
@@ -319,8 +646,7 @@ class MultiplayerService:
             return False
 
         # Validate direction change (can't reverse)
-        opposites = {"up": "down", "down": "up", "left": "right", "right": "left"}
-        if opposites.get(direction) == player.direction:
+        if direction not in OPPOSITES or OPPOSITES[direction] == player.direction:
             return False
 
         player.direction = direction
@@ -332,6 +658,7 @@ class MultiplayerService:
         if not game:
             return None
 
+        self._sync_snake_positions(game)
         return GameStateUpdate(
             game_id=game.game_id,
             status=game.status,
@@ -342,8 +669,13 @@ class MultiplayerService:
             winner_id=game.winner_id
         )
 
+    def game_state_message(self, state: GameStateUpdate) -> str:
+        """Serialize a game_state WebSocket message once, to be sent to every subscriber"""
+        return '{"type":"game_state","data":' + state.model_dump_json() + '}'
+
     def get_game_response(self, game: ActiveGame) -> GameResponse:
         """Convert ActiveGame to GameResponse"""
+        self._sync_snake_positions(game)
         return GameResponse(
             id=game.db_id,
             game_id=game.game_id,
@@ -370,52 +702,30 @@ class MultiplayerService:
         if not game or game.status != "playing":
             return None
 
+        if game.dirty_since is None:
+            game.dirty_since = time.monotonic()
+
+        # Tick-scoped occupancy map: every collision check is one dict lookup
+        occupied = self._build_occupancy(game)
+
         # Move each alive player's snake
-        for player in game.players.values():
-            if not player.is_alive:
-                continue
-
-            head = player.snake_positions[0]
-            dx, dy = {"up": (0, -1), "down": (0, 1), "left": (-1, 0), "right": (1, 0)}[player.direction]
-            new_head = Position(x=head.x + dx, y=head.y + dy)
-
-            # Check wall collision
-            if new_head.x < 0 or new_head.x >= game.grid_size or \
-               new_head.y < 0 or new_head.y >= game.grid_size:
-                player.is_alive = False
-                continue
-
-            # Check self collision
-            if any(pos.x == new_head.x and pos.y == new_head.y for pos in player.snake_positions):
-                player.is_alive = False
-                continue
-
-            # Check collision with other snakes
-            for other_id, other_player in game.players.items():
-                if other_id == player.user_id:
-                    continue
-                if any(pos.x == new_head.x and pos.y == new_head.y for pos in other_player.snake_positions):
-                    player.is_alive = False
-                    break
-
-            if not player.is_alive:
-                continue
-
-            # Move snake
-            player.snake_positions.insert(0, new_head)
-
-            # Check food
-            ate_food = False
-            for i, food in enumerate(game.food_positions):
-                if food.x == new_head.x and food.y == new_head.y:
-                    player.score += 10
-                    game.food_positions.pop(i)
-                    game.food_positions.append(self._spawn_food(game))
-                    ate_food = True
-                    break
-
-            if not ate_food:
-                player.snake_positions.pop()
+        snakes = [
+            (user_id, game.bodies[user_id], game.cell_deltas[player.direction])
+            for user_id, player in game.players.items()
+            if player.is_alive
+        ]
+        crashed, eaten = advance_snakes(snakes, occupied, game.grid_size)
+
+        for user_id in crashed:
+            game.players[user_id].is_alive = False
+
+        # Score eaten food and respawn it
+        for user_id, cell in eaten:
+            if self._remove_food(game, cell):
+                game.players[user_id].score += 10
+                food = self._spawn_food(game, occupied)
+                if food is not None:
+                    self._add_food(game, food)
 
         # Check for game over
         alive_players = [p for p in game.players.values() if p.is_alive]
@@ -424,14 +734,13 @@ class MultiplayerService:
             if alive_players:
                 game.winner_id = alive_players[0].user_id
 
-            # Update database
-            db_game = db.query(MultiplayerGame).filter(
-                MultiplayerGame.game_id == game_id
-            ).first()
-            if db_game:
-                db_game.status = "finished"
-                db_game.finished_at = utc_now()
-                db.commit()
+            # Update database, with a final snapshot of the players
+            self._enqueue_write(self._snapshot([game]))
+            self._enqueue_write(GameStatusWrite(
+                game_id=game_id,
+                status="finished",
+                finished_at=utc_now()
+            ))
 
         return self.get_game_state(game_id)
 
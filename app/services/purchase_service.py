@@ -2,107 +2,234 @@
 Purchase service for managing in-app purchases
 """
 import logging
+import time
+from dataclasses import dataclass
 from typing import Optional, List, Dict, Any, Tuple
 from uuid import UUID
 from datetime import datetime, timedelta
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
 
 from app.models.purchase import Purchase
 from app.models.user import User, UserPremiumContent
 from app.schemas.purchase import PurchaseReceipt, PremiumContentResponse
-from app.utils.time_utils import utc_now
+from app.utils.cache import TTLCache
+from app.utils.time_utils import utc_now, ensure_utc
 
 logger = logging.getLogger(__name__)
 
 
 # Product to content mapping - must match Flutter ProductIds exactly
-PRODUCT_CONTENT_MAP = {
+PRODUCT_CONTENT_MAP: Dict[str, Tuple[str, ...]] = {
     # Premium Themes
-    "crystal_theme": ["theme_crystal"],
-    "cyberpunk_theme": ["theme_cyberpunk"],
-    "space_theme": ["theme_space"],
-    "ocean_theme": ["theme_ocean"],
-    "desert_theme": ["theme_desert"],
-    "forest_theme": ["theme_forest"],
-    "premium_themes_bundle": [
+    "crystal_theme": ("theme_crystal",),
+    "cyberpunk_theme": ("theme_cyberpunk",),
+    "space_theme": ("theme_space",),
+    "ocean_theme": ("theme_ocean",),
+    "desert_theme": ("theme_desert",),
+    "forest_theme": ("theme_forest",),
+    "premium_themes_bundle": (
         "theme_crystal", "theme_cyberpunk", "theme_space",
         "theme_ocean", "theme_desert", "theme_forest"
-    ],
+    ),
 
     # Snake Coins (Consumable)
-    "coin_pack_small": ["coins_100"],
-    "coin_pack_medium": ["coins_550"],  # 500 + 50 bonus
-    "coin_pack_large": ["coins_1400"],  # 1200 + 200 bonus
-    "coin_pack_mega": ["coins_3000"],   # 2500 + 500 bonus
+    "coin_pack_small": ("coins_100",),
+    "coin_pack_medium": ("coins_550",),  # 500 + 50 bonus
+    "coin_pack_large": ("coins_1400",),  # 1200 + 200 bonus
+    "coin_pack_mega": ("coins_3000",),   # 2500 + 500 bonus
 
     # Premium Power-ups
-    "mega_powerups_pack": ["powerup_mega_speed", "powerup_mega_shield", "powerup_mega_magnet", "powerup_mega_slowmo"],
-    "exclusive_powerups_pack": ["powerup_teleport", "powerup_ghost", "powerup_shrink"],
-    "premium_powerups_bundle": [
+    "mega_powerups_pack": ("powerup_mega_speed", "powerup_mega_shield", "powerup_mega_magnet", "powerup_mega_slowmo"),
+    "exclusive_powerups_pack": ("powerup_teleport", "powerup_ghost", "powerup_shrink"),
+    "premium_powerups_bundle": (
         "powerup_mega_speed", "powerup_mega_shield", "powerup_mega_magnet", "powerup_mega_slowmo",
         "powerup_teleport", "powerup_ghost", "powerup_shrink"
-    ],
+    ),
 
     # Snake Skins
-    "golden": ["skin_golden"],
-    "rainbow": ["skin_rainbow"],
-    "galaxy": ["skin_galaxy"],
-    "dragon": ["skin_dragon"],
-    "electric": ["skin_electric"],
-    "fire": ["skin_fire"],
-    "ice": ["skin_ice"],
-    "shadow": ["skin_shadow"],
-    "neon": ["skin_neon"],
-    "crystal": ["skin_crystal"],
-    "cosmic": ["skin_cosmic"],
+    "golden": ("skin_golden",),
+    "rainbow": ("skin_rainbow",),
+    "galaxy": ("skin_galaxy",),
+    "dragon": ("skin_dragon",),
+    "electric": ("skin_electric",),
+    "fire": ("skin_fire",),
+    "ice": ("skin_ice",),
+    "shadow": ("skin_shadow",),
+    "neon": ("skin_neon",),
+    "crystal": ("skin_crystal",),
+    "cosmic": ("skin_cosmic",),
 
     # Trail Effects (prefixed with trail_ to avoid duplicate IDs)
-    "trail_particle": ["trail_particle"],
-    "trail_glow": ["trail_glow"],
-    "trail_rainbow": ["trail_rainbow"],
-    "trail_fire": ["trail_fire"],
-    "trail_electric": ["trail_electric"],
-    "trail_star": ["trail_star"],
-    "trail_cosmic": ["trail_cosmic"],
-    "trail_neon": ["trail_neon"],
-    "trail_shadow": ["trail_shadow"],
-    "trail_crystal": ["trail_crystal"],
-    "trail_dragon": ["trail_dragon"],
+    "trail_particle": ("trail_particle",),
+    "trail_glow": ("trail_glow",),
+    "trail_rainbow": ("trail_rainbow",),
+    "trail_fire": ("trail_fire",),
+    "trail_electric": ("trail_electric",),
+    "trail_star": ("trail_star",),
+    "trail_cosmic": ("trail_cosmic",),
+    "trail_neon": ("trail_neon",),
+    "trail_shadow": ("trail_shadow",),
+    "trail_crystal": ("trail_crystal",),
+    "trail_dragon": ("trail_dragon",),
 
     # Cosmetic Bundles
-    "starter_pack": ["skin_golden", "skin_fire", "trail_particle", "trail_glow"],
-    "elemental_pack": ["skin_fire", "skin_ice", "skin_electric", "trail_fire", "trail_electric"],
-    "cosmic_collection": ["skin_galaxy", "skin_cosmic", "skin_crystal", "trail_cosmic", "trail_crystal", "trail_star"],
-    "ultimate_collection": [
+    "starter_pack": ("skin_golden", "skin_fire", "trail_particle", "trail_glow"),
+    "elemental_pack": ("skin_fire", "skin_ice", "skin_electric", "trail_fire", "trail_electric"),
+    "cosmic_collection": ("skin_galaxy", "skin_cosmic", "skin_crystal", "trail_cosmic", "trail_crystal", "trail_star"),
+    "ultimate_collection": (
         "skin_golden", "skin_rainbow", "skin_galaxy", "skin_dragon", "skin_electric",
         "skin_fire", "skin_ice", "skin_shadow", "skin_neon", "skin_crystal", "skin_cosmic",
         "trail_particle", "trail_glow", "trail_rainbow", "trail_fire", "trail_electric",
         "trail_star", "trail_cosmic", "trail_neon", "trail_shadow", "trail_crystal", "trail_dragon"
-    ],
+    ),
 
     # Subscriptions
-    "snake_classic_pro_monthly": ["subscription_pro"],
-    "snake_classic_pro_yearly": ["subscription_pro"],
-    "battle_pass_season": ["battle_pass"],
+    "snake_classic_pro_monthly": ("subscription_pro",),
+    "snake_classic_pro_yearly": ("subscription_pro",),
+    "battle_pass_season": ("battle_pass",),
 
     # Tournament Entries (Consumable)
-    "tournament_bronze": ["tournament_entry_bronze"],
-    "tournament_silver": ["tournament_entry_silver"],
-    "tournament_gold": ["tournament_entry_gold"],
-    "championship_entry": ["tournament_entry_championship"],
-    "tournament_vip_entry": ["tournament_entry_vip"],
+    "tournament_bronze": ("tournament_entry_bronze",),
+    "tournament_silver": ("tournament_entry_silver",),
+    "tournament_gold": ("tournament_entry_gold",),
+    "championship_entry": ("tournament_entry_championship",),
+    "tournament_vip_entry": ("tournament_entry_vip",),
 }
 
-SUBSCRIPTION_PRODUCTS = {
+SUBSCRIPTION_PRODUCTS = frozenset({
     "snake_classic_pro_monthly",
     "snake_classic_pro_yearly",
     "battle_pass_season"
+})
+
+# How long each subscription product stays active after purchase
+PRODUCT_EXPIRY_DAYS: Dict[str, int] = {
+    "snake_classic_pro_monthly": 30,
+    "snake_classic_pro_yearly": 365,
+    "battle_pass_season": 60,
+}
+
+AUTO_RENEWING = frozenset({
+    "snake_classic_pro_monthly",
+    "snake_classic_pro_yearly"
+})
+
+
+@dataclass(frozen=True, slots=True)
+class ProductDelta:
+    """Pre-classified effect of unlocking one product's content"""
+    themes: Tuple[str, ...] = ()
+    powerups: Tuple[str, ...] = ()
+    cosmetics: Tuple[str, ...] = ()
+    coins: int = 0
+    tournament_entries: Tuple[str, ...] = ()
+    subscription: Optional[str] = None
+    battle_pass: bool = False
+
+
+def _classify_content(content: str) -> Tuple[Optional[str], Any]:
+    """Return (kind, payload) for a content string, or (None, None) if unknown"""
+    if content.startswith("theme_"):
+        return "theme", content.replace("theme_", "")
+    if content.startswith("powerup_"):
+        return "powerup", content
+    if content.startswith("skin_") or content.startswith("trail_"):
+        return "cosmetic", content
+    if content == "subscription_pro":
+        return "subscription", "pro"
+    if content == "battle_pass":
+        return "battle_pass", True
+    if content.startswith("tournament_entry_"):
+        return "tournament_entry", content.replace("tournament_entry_", "")
+    if content.startswith("coins_"):
+        try:
+            return "coins", int(content.replace("coins_", ""))
+        except ValueError:
+            return None, None
+    return None, None
+
+
+# Every content string referenced by a product, classified once
+CONTENT_KIND: Dict[str, Tuple[Optional[str], Any]] = {
+    content: _classify_content(content)
+    for contents in PRODUCT_CONTENT_MAP.values()
+    for content in contents
 }
 
 
+def _build_product_delta(content_unlocked: Tuple[str, ...]) -> ProductDelta:
+    """Fold a product's classified content into a single delta"""
+    buckets: Dict[str, List[Any]] = {
+        "theme": [], "powerup": [], "cosmetic": [], "tournament_entry": [], "coins": []
+    }
+    subscription = None
+    battle_pass = False
+
+    for content in content_unlocked:
+        kind, payload = CONTENT_KIND[content]
+        if kind == "subscription":
+            subscription = payload
+        elif kind == "battle_pass":
+            battle_pass = True
+        elif kind is not None:
+            buckets[kind].append(payload)
+
+    return ProductDelta(
+        themes=tuple(dict.fromkeys(buckets["theme"])),
+        powerups=tuple(dict.fromkeys(buckets["powerup"])),
+        cosmetics=tuple(dict.fromkeys(buckets["cosmetic"])),
+        coins=sum(buckets["coins"]),
+        tournament_entries=tuple(buckets["tournament_entry"]),
+        subscription=subscription,
+        battle_pass=battle_pass
+    )
+
+
+PRODUCT_DELTAS: Dict[str, ProductDelta] = {
+    product_id: _build_product_delta(content)
+    for product_id, content in PRODUCT_CONTENT_MAP.items()
+}
+EMPTY_DELTA = ProductDelta()
+
+
+def _merge_owned(owned: Optional[List[str]], additions: Tuple[str, ...]) -> Optional[List[str]]:
+    """Append additions not already owned, keeping the existing order.
+
+    Returns None when everything is already owned, so the caller can leave
+    the column untouched.
+    """
+    seen = set(owned or ())
+    new_items = [item for item in additions if item not in seen]
+    if not new_items:
+        return None
+    return list(owned or []) + new_items
+
+
+# Seconds a user's premium status response is served from memory
+PREMIUM_CACHE_TTL = 30
+
+
+def _expires_after(expires_at: Optional[datetime], now_epoch: float) -> bool:
+    """
+    Whether an expiry timestamp is later than now_epoch (UNIX seconds).
+    Naive column values are treated as UTC.
+    """
+    return expires_at is not None and ensure_utc(expires_at).timestamp() > now_epoch
+
+
 class PurchaseService:
     """Service for purchase operations"""
 
+    def __init__(self):
+        # user_id -> PremiumContentResponse, polled on every home screen open
+        self._premium_cache = TTLCache(PREMIUM_CACHE_TTL, max_size=10000)
+
+    def invalidate_premium_cache(self, user_id: UUID):
+        """Drop a user's cached premium status after it changes"""
+        self._premium_cache.delete(user_id)
+
     async def verify_with_store(self, receipt: PurchaseReceipt) -> Dict[str, Any]:
         """
         Verify purchase with app store.
@@ -128,69 +255,82 @@ class PurchaseService:
         Process a verified purchase and unlock content.
         Returns: (purchase, content_unlocked)
         """
-        # Check for duplicate transaction
-        existing = db.query(Purchase).filter(
-            Purchase.transaction_id == receipt.transaction_id
-        ).first()
-
-        if existing:
-            return existing, existing.content_unlocked or []
-
         # Determine content to unlock
-        content_unlocked = PRODUCT_CONTENT_MAP.get(receipt.product_id, [])
+        content_unlocked = list(PRODUCT_CONTENT_MAP.get(receipt.product_id, ()))
 
         # Check if subscription
         is_subscription = receipt.product_id in SUBSCRIPTION_PRODUCTS
         expires_at = None
         auto_renewing = False
+        now = utc_now()
 
         if is_subscription:
-            if receipt.product_id == "snake_classic_pro":
-                expires_at = utc_now() + timedelta(days=30)
-                auto_renewing = True
-            elif receipt.product_id == "battle_pass_season":
-                expires_at = utc_now() + timedelta(days=60)
-                auto_renewing = False
-
-        # Create purchase record
-        purchase = Purchase(
-            user_id=user_id,
-            product_id=receipt.product_id,
-            transaction_id=receipt.transaction_id,
-            platform=receipt.platform,
-            receipt_data=receipt.receipt_data,
-            is_verified=verification_result.get("valid", False),
-            is_subscription=is_subscription,
-            expires_at=expires_at,
-            auto_renewing=auto_renewing,
-            content_unlocked=content_unlocked,
-            purchase_timestamp=receipt.purchase_time,
-            verified_at=utc_now()
-        )
-        db.add(purchase)
+            expires_at = now + timedelta(days=PRODUCT_EXPIRY_DAYS[receipt.product_id])
+            auto_renewing = receipt.product_id in AUTO_RENEWING
+
+        # Insert the purchase record; a duplicate transaction inserts nothing,
+        # so concurrent verifications of one receipt can't both unlock content
+        purchase = db.scalars(
+            pg_insert(Purchase)
+            .values(
+                user_id=user_id,
+                product_id=receipt.product_id,
+                transaction_id=receipt.transaction_id,
+                platform=receipt.platform,
+                receipt_data=receipt.receipt_data,
+                is_verified=verification_result.get("valid", False),
+                is_subscription=is_subscription,
+                expires_at=expires_at,
+                auto_renewing=auto_renewing,
+                content_unlocked=content_unlocked,
+                purchase_timestamp=receipt.purchase_time,
+                verified_at=now
+            )
+            .on_conflict_do_nothing(index_elements=[Purchase.transaction_id])
+            .returning(Purchase)
+        ).first()
+
+        if purchase is None:
+            existing = db.execute(
+                select(Purchase).where(Purchase.transaction_id == receipt.transaction_id)
+            ).scalar_one()
+            return existing, existing.content_unlocked or []
+
+        premium = self.get_premium_row(db, user_id)
 
         # Update user's premium content
-        self._update_premium_content(db, user_id, receipt.product_id, content_unlocked, expires_at)
+        self._update_premium_content(db, user_id, receipt.product_id, expires_at, premium)
 
         db.commit()
         db.refresh(purchase)
+        self.invalidate_premium_cache(user_id)
 
         return purchase, content_unlocked
 
+    def get_premium_row(self, db: Session, user_id: UUID) -> Optional[UserPremiumContent]:
+        """
+        Get the user's UserPremiumContent row, reusing it from the session's
+        identity map when this request already loaded it.
+        """
+        # user_id is unique but not the primary key, so db.get() can't be used
+        for obj in db.identity_map.values():
+            if isinstance(obj, UserPremiumContent) and obj.user_id == user_id:
+                return obj
+
+        return db.execute(
+            select(UserPremiumContent).where(UserPremiumContent.user_id == user_id)
+        ).scalar_one_or_none()
+
     def _update_premium_content(
         self,
         db: Session,
         user_id: UUID,
         product_id: str,
-        content_unlocked: List[str],
-        expires_at: Optional[datetime]
+        expires_at: Optional[datetime],
+        premium: Optional[UserPremiumContent]
     ):
         """Update user's premium content based on purchase"""
-        # Get or create premium content record
-        premium = db.query(UserPremiumContent).filter(
-            UserPremiumContent.user_id == user_id
-        ).first()
-
+        # Create the premium content record if the user has none yet
         if not premium:
             premium = UserPremiumContent(
                 user_id=user_id,
@@ -205,60 +345,61 @@ class PurchaseService:
             )
             db.add(premium)
 
-        # Process each content item
-        for content in content_unlocked:
-            if content.startswith("theme_"):
-                theme = content.replace("theme_", "")
-                if theme not in (premium.owned_themes or []):
-                    themes = list(premium.owned_themes or [])
-                    themes.append(theme)
-                    premium.owned_themes = themes
-
-            elif content.startswith("powerup_"):
-                if content not in (premium.owned_powerups or []):
-                    powerups = list(premium.owned_powerups or [])
-                    powerups.append(content)
-                    premium.owned_powerups = powerups
-
-            elif content.startswith("skin_") or content.startswith("trail_"):
-                if content not in (premium.owned_cosmetics or []):
-                    cosmetics = list(premium.owned_cosmetics or [])
-                    cosmetics.append(content)
-                    premium.owned_cosmetics = cosmetics
-
-            elif content == "subscription_pro":
-                premium.premium_tier = "pro"
-                premium.subscription_active = True
-                premium.subscription_expires_at = expires_at
-
-            elif content == "battle_pass":
-                premium.battle_pass_active = True
-                premium.battle_pass_expires_at = expires_at
-                premium.battle_pass_tier = 0
-
-            elif content.startswith("tournament_entry_"):
-                entry_type = content.replace("tournament_entry_", "")
-                entries = dict(premium.tournament_entries or {})
+        # Apply the product's precomputed content delta
+        delta = PRODUCT_DELTAS.get(product_id, EMPTY_DELTA)
+
+        # Only reassign owned lists that actually gain items, so re-buying a
+        # bundle doesn't rewrite unchanged JSONB columns
+        themes = _merge_owned(premium.owned_themes, delta.themes)
+        if themes is not None:
+            premium.owned_themes = themes
+        powerups = _merge_owned(premium.owned_powerups, delta.powerups)
+        if powerups is not None:
+            premium.owned_powerups = powerups
+        cosmetics = _merge_owned(premium.owned_cosmetics, delta.cosmetics)
+        if cosmetics is not None:
+            premium.owned_cosmetics = cosmetics
+
+        if delta.subscription:
+            premium.premium_tier = delta.subscription
+            premium.subscription_active = True
+            premium.subscription_expires_at = expires_at
+
+        if delta.battle_pass:
+            premium.battle_pass_active = True
+            premium.battle_pass_expires_at = expires_at
+            premium.battle_pass_tier = 0
+
+        if delta.tournament_entries:
+            entries = dict(premium.tournament_entries or {})
+            for entry_type in delta.tournament_entries:
                 entries[entry_type] = entries.get(entry_type, 0) + 1
-                premium.tournament_entries = entries
+            premium.tournament_entries = entries
 
-            elif content.startswith("coins_"):
-                amount_str = content.replace("coins_", "")
-                try:
-                    amount = int(amount_str)
-                    premium.coins = (premium.coins or 0) + amount
-                except ValueError:
-                    pass
+        if delta.coins:
+            premium.coins = (premium.coins or 0) + delta.coins
 
     def get_user_premium_content(
         self,
         db: Session,
         user_id: UUID
     ) -> PremiumContentResponse:
-        """Get user's premium content status"""
-        premium = db.query(UserPremiumContent).filter(
-            UserPremiumContent.user_id == user_id
-        ).first()
+        """Get user's premium content status (cached for PREMIUM_CACHE_TTL seconds)"""
+        cached = self._premium_cache.get(user_id)
+        if cached is not None:
+            return cached
+
+        response = self._build_premium_response(db, user_id)
+        self._premium_cache.set(user_id, response)
+        return response
+
+    def _build_premium_response(
+        self,
+        db: Session,
+        user_id: UUID
+    ) -> PremiumContentResponse:
+        """Load and evaluate a user's premium content status"""
+        premium = self.get_premium_row(db, user_id)
 
         if not premium:
             return PremiumContentResponse(
@@ -274,16 +415,14 @@ class PurchaseService:
             )
 
         # Check if subscriptions are still active
-        now = utc_now()
-        subscription_active = (
+        now_epoch = time.time()
+        subscription_active = bool(
             premium.subscription_active and
-            premium.subscription_expires_at and
-            premium.subscription_expires_at > now
+            _expires_after(premium.subscription_expires_at, now_epoch)
         )
-        battle_pass_active = (
+        battle_pass_active = bool(
             premium.battle_pass_active and
-            premium.battle_pass_expires_at and
-            premium.battle_pass_expires_at > now
+            _expires_after(premium.battle_pass_expires_at, now_epoch)
         )
 
         return PremiumContentResponse(
@@ -305,9 +444,11 @@ class PurchaseService:
         user_id: UUID
     ) -> List[Purchase]:
         """Get user's purchase history"""
-        return db.query(Purchase).filter(
-            Purchase.user_id == user_id
-        ).order_by(Purchase.created_at.desc()).all()
+        return list(db.execute(
+            select(Purchase)
+            .where(Purchase.user_id == user_id)
+            .order_by(Purchase.created_at.desc())
+        ).scalars())
 
 
 purchase_service = PurchaseService()
@@ -1,17 +1,22 @@
+import asyncio
 import logging
 from datetime import datetime, time, timedelta
 from typing import List, Dict, Any, Optional
+from uuid import uuid4
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.schedulers.base import STATE_RUNNING
+from apscheduler.jobstores.base import JobLookupError
 from apscheduler.jobstores.memory import MemoryJobStore
-from apscheduler.executors.pool import ThreadPoolExecutor
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.executors.asyncio import AsyncIOExecutor
 from apscheduler.triggers.date import DateTrigger
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.interval import IntervalTrigger
 
 from .firebase_service import firebase_service
+from ..database import engine
 from ..models.notification import (
     NotificationRequest,
-    IndividualNotificationRequest,
     TopicNotificationRequest,
     GameNotificationTemplates,
     NotificationType,
@@ -20,6 +25,74 @@ from ..models.notification import (
 
 logger = logging.getLogger(__name__)
 
+# Table APScheduler keeps its persisted jobs in
+JOBSTORE_TABLE = "apscheduler_jobs"
+
+# In-memory job store for jobs that need no persistence (view refreshes),
+# so their frequent runs don't read and write the jobs table on the loop
+MEMORY_JOBSTORE = "memory"
+
+# Recurring job triggers, built once at import
+DAILY_CHALLENGE_TRIGGER = CronTrigger(hour=9, minute=0)                  # 9:00 AM every day
+WEEKLY_LEADERBOARD_TRIGGER = CronTrigger(day_of_week=6, hour=18, minute=0)  # Sunday 6:00 PM
+RETENTION_CAMPAIGN_TRIGGER = CronTrigger(hour=14, minute=0)              # 2:00 PM
+DAILY_VIEW_REFRESH_TRIGGER = IntervalTrigger(seconds=60)
+WEEKLY_VIEW_REFRESH_TRIGGER = IntervalTrigger(minutes=5)
+TOURNAMENT_VIEW_REFRESH_TRIGGER = IntervalTrigger(seconds=30)
+
+# Seconds a run may start late and still fire. One-off notifications are
+# time-sensitive ("starts in 5 minutes"), so they are dropped quickly;
+# daily/weekly campaigns may still go out a few minutes late after a restart.
+ONE_OFF_MISFIRE_GRACE = 30
+RECURRING_MISFIRE_GRACE = 300
+
+# Cap on concurrent FCM calls when fanning out a scheduled notification
+FCM_FANOUT_CONCURRENCY = 64
+
+
+def _topic_request(notification: NotificationRequest, topic: str) -> TopicNotificationRequest:
+    """Address a notification to a topic"""
+    return TopicNotificationRequest(**notification.model_dump(), topic=topic)
+
+
+# Fixed recurring notifications, validated once at import. The Firebase
+# service only reads requests, so the same objects are sent every time.
+DAILY_CHALLENGE_TOPIC_REQUEST = _topic_request(
+    GameNotificationTemplates.daily_challenge(),
+    "daily_challenge"  # Users subscribed to daily challenges
+)
+
+WEEKLY_LEADERBOARD_TOPIC_REQUEST = _topic_request(
+    NotificationRequest(
+        title="📊 Weekly Leaderboard Updated!",
+        body="See how you ranked this week and check out the new challenges!",
+        notification_type=NotificationType.SPECIAL_EVENT,
+        route="leaderboard",
+        data={"action": "weekly_update", "period": "weekly"}
+    ),
+    "leaderboard_updates"
+)
+
+RETENTION_TOPIC_REQUEST = _topic_request(
+    NotificationRequest(
+        title="🐍 We miss you!",
+        body="Come back and beat your high score! New achievements await!",
+        notification_type=NotificationType.DAILY_REMINDER,
+        route="home",
+        data={"action": "retention", "campaign": "comeback"}
+    ),
+    "retention_campaign"
+)
+
+
+def _job_ref(method_name: str) -> str:
+    """Textual reference to a scheduler_service method.
+
+    Persistent job stores can only serialize importable callables, not
+    bound methods, so jobs point at the module-level instance by name.
+    """
+    return f"{__name__}:scheduler_service.{method_name}"
+
 
 class SchedulerService:
     """Service for scheduling and managing automated notifications."""
@@ -30,14 +103,21 @@ class SchedulerService:
     
     def _initialize_scheduler(self):
         """Initialize the APScheduler instance."""
+        # Jobs survive restarts, so scheduled and tournament notifications
+        # aren't lost and recurring jobs aren't re-planned from scratch.
+        # Interval view refreshes live in memory and are re-added on start.
         jobstores = {
-            'default': MemoryJobStore(),
+            'default': SQLAlchemyJobStore(engine=engine, tablename=JOBSTORE_TABLE),
+            MEMORY_JOBSTORE: MemoryJobStore(),
         }
+        # Coroutine jobs run directly on the event loop; the few sync jobs
+        # (view refreshes) go to the loop's default thread pool
         executors = {
-            'default': ThreadPoolExecutor(20),
+            'default': AsyncIOExecutor(),
         }
         job_defaults = {
-            'coalesce': False,
+            # Runs missed while the app was down collapse into one on restart
+            'coalesce': True,
             'max_instances': 3
         }
         
@@ -65,48 +145,92 @@ class SchedulerService:
         """Set up recurring notification jobs."""
         # Daily challenge reminder - 9:00 AM every day
         self.scheduler.add_job(
-            func=self._send_daily_challenge_reminder,
-            trigger=CronTrigger(hour=9, minute=0),
+            func=_job_ref('_send_daily_challenge_reminder'),
+            trigger=DAILY_CHALLENGE_TRIGGER,
             id='daily_challenge_reminder',
             name='Daily Challenge Reminder',
+            misfire_grace_time=RECURRING_MISFIRE_GRACE,
             replace_existing=True
         )
         
         # Weekly leaderboard update - Sunday 6:00 PM
         self.scheduler.add_job(
-            func=self._send_weekly_leaderboard_update,
-            trigger=CronTrigger(day_of_week=6, hour=18, minute=0),
+            func=_job_ref('_send_weekly_leaderboard_update'),
+            trigger=WEEKLY_LEADERBOARD_TRIGGER,
             id='weekly_leaderboard_update',
             name='Weekly Leaderboard Update',
+            misfire_grace_time=RECURRING_MISFIRE_GRACE,
             replace_existing=True
         )
         
         # Retention campaign for inactive users - every 3 days at 2:00 PM
         self.scheduler.add_job(
-            func=self._send_retention_notifications,
-            trigger=CronTrigger(hour=14, minute=0),
+            func=_job_ref('_send_retention_notifications'),
+            trigger=RETENTION_CAMPAIGN_TRIGGER,
             id='retention_campaign',
             name='User Retention Campaign',
+            misfire_grace_time=RECURRING_MISFIRE_GRACE,
             replace_existing=True
         )
         
+        # Leaderboard materialized view refreshes (not persisted)
+        self.scheduler.add_job(
+            func=_job_ref('_refresh_leaderboard_view'),
+            trigger=DAILY_VIEW_REFRESH_TRIGGER,
+            args=['mv_leaderboard_daily'],
+            id='refresh_daily_leaderboard',
+            name='Refresh Daily Leaderboard',
+            jobstore=MEMORY_JOBSTORE,
+            replace_existing=True
+        )
+        
+        self.scheduler.add_job(
+            func=_job_ref('_refresh_leaderboard_view'),
+            trigger=WEEKLY_VIEW_REFRESH_TRIGGER,
+            args=['mv_leaderboard_weekly'],
+            id='refresh_weekly_leaderboard',
+            name='Refresh Weekly Leaderboard',
+            jobstore=MEMORY_JOBSTORE,
+            replace_existing=True
+        )
+        
+        self.scheduler.add_job(
+            func=_job_ref('_refresh_tournament_leaderboard'),
+            trigger=TOURNAMENT_VIEW_REFRESH_TRIGGER,
+            id='refresh_tournament_leaderboard',
+            name='Refresh Tournament Leaderboard',
+            jobstore=MEMORY_JOBSTORE,
+            replace_existing=True
+        )
+        
+        # Drop copies of the refresh jobs persisted by earlier deployments
+        for job_id in ('refresh_daily_leaderboard', 'refresh_weekly_leaderboard',
+                       'refresh_tournament_leaderboard'):
+            try:
+                self.scheduler.remove_job(job_id, jobstore='default')
+            except JobLookupError:
+                pass
+        
         logger.info("Recurring notification jobs scheduled")
     
     async def schedule_notification(self, request: ScheduledNotificationRequest) -> Dict[str, Any]:
         """Schedule a notification for future delivery."""
         try:
-            job_id = f"scheduled_notification_{datetime.utcnow().timestamp()}"
+            # Random id: timestamps can collide, and replace_existing would
+            # then silently overwrite the earlier job
+            job_id = f"scheduled_notification_{uuid4().hex}"
             
             # Create the trigger for the scheduled time
             trigger = DateTrigger(run_date=request.scheduled_time)
             
             # Schedule the job
             self.scheduler.add_job(
-                func=self._send_scheduled_notification,
+                func=_job_ref('_send_scheduled_notification'),
                 trigger=trigger,
                 args=[request],
                 id=job_id,
                 name=f"Scheduled: {request.title}",
+                misfire_grace_time=ONE_OFF_MISFIRE_GRACE,
                 replace_existing=True
             )
             
@@ -163,59 +287,88 @@ class SchedulerService:
         try:
             logger.info(f"Executing scheduled notification: {request.title}")
             
-            if request.recipient_type == "topics":
-                # Send to topics
-                for topic in request.recipients:
-                    topic_request = TopicNotificationRequest(
-                        title=request.title,
-                        body=request.body,
-                        notification_type=request.notification_type,
-                        priority=request.priority,
-                        data=request.data,
-                        image_url=request.image_url,
-                        route=request.route,
-                        route_params=request.route_params,
-                        topic=topic
-                    )
-                    await firebase_service.send_to_topic(topic_request)
-            else:
-                # Send to individual tokens
-                for token in request.recipients:
-                    individual_request = IndividualNotificationRequest(
-                        title=request.title,
-                        body=request.body,
-                        notification_type=request.notification_type,
-                        priority=request.priority,
-                        data=request.data,
-                        image_url=request.image_url,
-                        route=request.route,
-                        route_params=request.route_params,
-                        fcm_token=token
-                    )
-                    await firebase_service.send_to_token(individual_request)
+            common = dict(
+                title=request.title,
+                body=request.body,
+                notification_type=request.notification_type,
+                priority=request.priority,
+                data=request.data,
+                image_url=request.image_url,
+                route=request.route,
+                route_params=request.route_params
+            )
+            
+            if request.recipient_type != "topics":
+                # Tokens go out as chunked multicasts (500 per FCM call)
+                result = await firebase_service.send_multicast(
+                    NotificationRequest(**common), request.recipients
+                )
+                logger.info(f"Scheduled notification sent: {request.title} ({result.message})")
+                return
+            
+            # Topics can't be multicast; fan out concurrently, capped to stay
+            # within FCM quotas
+            topic_requests = [TopicNotificationRequest(**common, topic=topic) for topic in request.recipients]
+            semaphore = asyncio.Semaphore(FCM_FANOUT_CONCURRENCY)
+            
+            async def send_limited(topic_request):
+                async with semaphore:
+                    return await firebase_service.send_to_topic(topic_request)
+            
+            results = await asyncio.gather(
+                *(send_limited(r) for r in topic_requests),
+                return_exceptions=True
+            )
+            
+            failed = 0
+            for idx, result in enumerate(results):
+                if isinstance(result, Exception):
+                    failed += 1
+                    logger.error(f"Scheduled notification topic {idx} failed: {result}")
+                elif not result.success:
+                    failed += 1
+                    logger.warning(f"Scheduled notification topic {idx} failed: {result.message}")
             
-            logger.info(f"Scheduled notification sent successfully: {request.title}")
+            logger.info(
+                f"Scheduled notification sent: {request.title} "
+                f"({len(results) - failed}/{len(results)} topics)"
+            )
             
         except Exception as e:
             logger.error(f"Failed to send scheduled notification: {e}")
     
+    def _refresh_leaderboard_view(self, view_name: str):
+        """Refresh a leaderboard materialized view (runs in the event loop's default thread pool)."""
+        from ..database import SessionLocal
+        from .leaderboard_service import leaderboard_service
+        
+        db = SessionLocal()
+        try:
+            leaderboard_service.refresh_leaderboard_view(db, view_name)
+        except Exception as e:
+            logger.error(f"Failed to refresh leaderboard view {view_name}: {e}")
+        finally:
+            db.close()
+    
+    def _refresh_tournament_leaderboard(self):
+        """Refresh the active tournament leaderboard view (runs in the event loop's default thread pool)."""
+        from ..database import SessionLocal
+        from .tournament_service import tournament_service
+        
+        db = SessionLocal()
+        try:
+            tournament_service.refresh_leaderboard_view(db)
+        except Exception as e:
+            logger.error(f"Failed to refresh tournament leaderboard view: {e}")
+        finally:
+            db.close()
+    
     async def _send_daily_challenge_reminder(self):
         """Send daily challenge reminder to all users."""
         try:
             logger.info("Sending daily challenge reminders")
             
-            notification = GameNotificationTemplates.daily_challenge()
-            topic_request = TopicNotificationRequest(
-                title=notification.title,
-                body=notification.body,
-                notification_type=notification.notification_type,
-                priority=notification.priority,
-                data=notification.data,
-                route=notification.route,
-                topic="daily_challenge"  # Users subscribed to daily challenges
-            )
-            
-            result = await firebase_service.send_to_topic(topic_request)
+            result = await firebase_service.send_to_topic(DAILY_CHALLENGE_TOPIC_REQUEST)
             logger.info(f"Daily challenge reminder sent: {result.message}")
             
         except Exception as e:
@@ -226,25 +379,7 @@ class SchedulerService:
         try:
             logger.info("Sending weekly leaderboard update")
             
-            notification = NotificationRequest(
-                title="📊 Weekly Leaderboard Updated!",
-                body="See how you ranked this week and check out the new challenges!",
-                notification_type=NotificationType.SPECIAL_EVENT,
-                route="leaderboard",
-                data={"action": "weekly_update", "period": "weekly"}
-            )
-            
-            topic_request = TopicNotificationRequest(
-                title=notification.title,
-                body=notification.body,
-                notification_type=notification.notification_type,
-                priority=notification.priority,
-                data=notification.data,
-                route=notification.route,
-                topic="leaderboard_updates"
-            )
-            
-            result = await firebase_service.send_to_topic(topic_request)
+            result = await firebase_service.send_to_topic(WEEKLY_LEADERBOARD_TOPIC_REQUEST)
             logger.info(f"Weekly leaderboard update sent: {result.message}")
             
         except Exception as e:
@@ -257,26 +392,7 @@ class SchedulerService:
             
             # This would typically query your user database to find inactive users
             # For now, we'll send a general retention message to the retention topic
-            
-            notification = NotificationRequest(
-                title="🐍 We miss you!",
-                body="Come back and beat your high score! New achievements await!",
-                notification_type=NotificationType.DAILY_REMINDER,
-                route="home",
-                data={"action": "retention", "campaign": "comeback"}
-            )
-            
-            topic_request = TopicNotificationRequest(
-                title=notification.title,
-                body=notification.body,
-                notification_type=notification.notification_type,
-                priority=notification.priority,
-                data=notification.data,
-                route=notification.route,
-                topic="retention_campaign"
-            )
-            
-            result = await firebase_service.send_to_topic(topic_request)
+            result = await firebase_service.send_to_topic(RETENTION_TOPIC_REQUEST)
             logger.info(f"Retention notifications sent: {result.message}")
             
         except Exception as e:
@@ -290,51 +406,64 @@ class SchedulerService:
         reminder_times: List[int] = [60, 15, 5]  # minutes before start
     ) -> List[str]:
         """Schedule tournament-related notifications."""
-        job_ids = []
+        # Build every job up front: (func, run_date, args, job_id, name)
+        now = datetime.utcnow()
+        jobs = []
+        
+        # Reminder notifications that are still in the future
+        for minutes_before in reminder_times:
+            reminder_time = start_time - timedelta(minutes=minutes_before)
+            if reminder_time <= now:
+                continue
+            
+            notification = NotificationRequest(
+                title=f"🏆 Tournament Starting Soon!",
+                body=f"{tournament_name} starts in {minutes_before} minutes!",
+                notification_type=NotificationType.TOURNAMENT,
+                route="tournament_detail",
+                route_params={"tournament_id": tournament_id},
+                data={"tournament_id": tournament_id, "minutes_until": minutes_before}
+            )
+            jobs.append((
+                '_send_tournament_reminder',
+                reminder_time,
+                [notification, tournament_id],
+                f"tournament_reminder_{tournament_id}_{minutes_before}min",
+                f"Tournament Reminder: {tournament_name} ({minutes_before}min)"
+            ))
+        
+        # Tournament start notification
+        start_notification = GameNotificationTemplates.tournament_started(tournament_name, tournament_id)
+        jobs.append((
+            '_send_tournament_start',
+            start_time,
+            [start_notification, tournament_id],
+            f"tournament_start_{tournament_id}",
+            f"Tournament Start: {tournament_name}"
+        ))
         
         try:
-            # Schedule reminder notifications
-            for minutes_before in reminder_times:
-                reminder_time = start_time - timedelta(minutes=minutes_before)
-                
-                if reminder_time > datetime.utcnow():
-                    notification = NotificationRequest(
-                        title=f"🏆 Tournament Starting Soon!",
-                        body=f"{tournament_name} starts in {minutes_before} minutes!",
-                        notification_type=NotificationType.TOURNAMENT,
-                        route="tournament_detail",
-                        route_params={"tournament_id": tournament_id},
-                        data={"tournament_id": tournament_id, "minutes_until": minutes_before}
-                    )
-                    
-                    job_id = f"tournament_reminder_{tournament_id}_{minutes_before}min"
-                    
+            # Hold job processing while the batch is inserted so the scheduler
+            # wakes up once for all of them instead of once per job
+            pause = self.scheduler.state == STATE_RUNNING
+            if pause:
+                self.scheduler.pause()
+            try:
+                for method_name, run_date, args, job_id, name in jobs:
                     self.scheduler.add_job(
-                        func=self._send_tournament_reminder,
-                        trigger=DateTrigger(run_date=reminder_time),
-                        args=[notification, tournament_id],
+                        func=_job_ref(method_name),
+                        trigger=DateTrigger(run_date=run_date),
+                        args=args,
                         id=job_id,
-                        name=f"Tournament Reminder: {tournament_name} ({minutes_before}min)",
+                        name=name,
+                        misfire_grace_time=ONE_OFF_MISFIRE_GRACE,
                         replace_existing=True
                     )
-                    
-                    job_ids.append(job_id)
-            
-            # Schedule tournament start notification
-            start_notification = GameNotificationTemplates.tournament_started(tournament_name, tournament_id)
-            start_job_id = f"tournament_start_{tournament_id}"
-            
-            self.scheduler.add_job(
-                func=self._send_tournament_start,
-                trigger=DateTrigger(run_date=start_time),
-                args=[start_notification, tournament_id],
-                id=start_job_id,
-                name=f"Tournament Start: {tournament_name}",
-                replace_existing=True
-            )
-            
-            job_ids.append(start_job_id)
+            finally:
+                if pause:
+                    self.scheduler.resume()
             
+            job_ids = [job[3] for job in jobs]
             logger.info(f"Scheduled {len(job_ids)} tournament notifications for {tournament_name}")
             return job_ids
             
@@ -1,21 +1,33 @@
 """
 Score service for managing game scores
 """
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from uuid import UUID
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
+from sqlalchemy import func, desc, insert, select, update, values, column, and_, Integer, String
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
-from app.models.score import Score
+from app.models.score import Score, UserBestScore
 from app.models.user import User
-from app.schemas.score import ScoreSubmit, UserScoreStats
+from app.schemas.score import ScoreSubmit, ScoreResponse, UserScoreStats
+from app.services.leaderboard_service import leaderboard_service
+from app.utils.cache import TTLCache
 from app.utils.time_utils import utc_now
 
 
+# Seconds the global recent-scores feed is served from memory. Not invalidated
+# on submit: every score changes the feed, so the TTL alone bounds staleness.
+RECENT_SCORES_TTL = 10
+
+
 class ScoreService:
     """Service for score operations"""
 
+    def __init__(self):
+        # Recent score feeds, keyed by (game_mode, limit)
+        self._recent_cache = TTLCache(ttl_seconds=RECENT_SCORES_TTL)
+
     def submit_score(
         self,
         db: Session,
@@ -26,50 +38,126 @@ class ScoreService:
         Submit a new score.
         Returns: (score, is_high_score, rank, was_duplicate)
         """
-        # Check for existing score with same idempotency key (prevents duplicates on retry)
-        if score_data.idempotency_key:
+        # Insert the score with a Core INSERT ... RETURNING rather than an ORM
+        # flush, and hand back a transient Score that never needs a refresh.
+        # A retried submission conflicts on the partial unique index over
+        # idempotency_key and inserts nothing.
+        payload = {
+            "user_id": user_id,
+            "score": score_data.score,
+            "game_duration_seconds": score_data.game_duration_seconds,
+            "foods_eaten": score_data.foods_eaten,
+            "game_mode": score_data.game_mode,
+            "difficulty": score_data.difficulty,
+            "game_data": score_data.game_data or {},
+            "played_at": score_data.played_at,
+            "idempotency_key": score_data.idempotency_key,
+        }
+        inserted = db.execute(
+            pg_insert(Score)
+            .values(**payload)
+            .on_conflict_do_nothing(
+                index_elements=[Score.idempotency_key],
+                index_where=Score.idempotency_key.isnot(None)
+            )
+            .returning(Score.id, Score.created_at)
+        ).first()
+
+        if inserted is None:
+            # Return existing score (idempotent response)
             existing = db.query(Score).filter(
                 Score.idempotency_key == score_data.idempotency_key
-            ).first()
-            if existing:
-                # Return existing score (idempotent response)
-                user = db.query(User).filter(User.id == user_id).first()
-                is_high_score = existing.score >= (user.high_score or 0) if user else False
-                rank = self.get_score_rank(db, existing.score, existing.game_mode, existing.difficulty)
-                return existing, is_high_score, rank, True  # was_duplicate=True
-
-        # Create score record
-        score = Score(
-            user_id=user_id,
-            score=score_data.score,
-            game_duration_seconds=score_data.game_duration_seconds,
-            foods_eaten=score_data.foods_eaten,
-            game_mode=score_data.game_mode,
-            difficulty=score_data.difficulty,
-            game_data=score_data.game_data or {},
-            played_at=score_data.played_at,
-            idempotency_key=score_data.idempotency_key,
-        )
-        db.add(score)
-
-        # Update user stats
-        user = db.query(User).filter(User.id == user_id).first()
-        is_high_score = False
-        if user:
-            user.total_games_played = (user.total_games_played or 0) + 1
-            user.total_score = (user.total_score or 0) + score_data.score
-            if score_data.score > (user.high_score or 0):
-                user.high_score = score_data.score
-                is_high_score = True
+            ).one()
+            high_score = db.query(User.high_score).filter(User.id == user_id).scalar()
+            is_high_score = existing.score >= (high_score or 0)
+            rank = self.get_score_rank(db, existing.score, existing.game_mode, existing.difficulty)
+            return existing, is_high_score, rank, True  # was_duplicate=True
+
+        score = Score(id=inserted.id, created_at=inserted.created_at, **payload)
+        self._update_best_score(db, user_id, score_data)
+
+        previous_high = self._apply_user_stats(db, user_id, [score_data.score])
+        is_high_score = previous_high is not None and score_data.score > previous_high
 
         db.commit()
-        db.refresh(score)
+        leaderboard_service.invalidate_user_rank(user_id, score_data.game_mode, score_data.difficulty)
 
         # Get rank
         rank = self.get_score_rank(db, score_data.score, score_data.game_mode, score_data.difficulty)
 
         return score, is_high_score, rank, False  # was_duplicate=False
 
+    def _apply_user_stats(
+        self,
+        db: Session,
+        user_id: UUID,
+        scores: List[int]
+    ) -> Optional[int]:
+        """
+        Add games to the user's totals and raise their high score, in one UPDATE.
+        Returns the high score from before the update, or None if the user doesn't exist.
+        """
+        # Join a snapshot of the row so RETURNING yields the pre-update high score
+        previous = (
+            select(User.id, func.coalesce(User.high_score, 0).label("high_score"))
+            .where(User.id == user_id)
+            .subquery("previous")
+        )
+        row = db.execute(
+            update(User)
+            .where(User.id == user_id, User.id == previous.c.id)
+            .values(
+                total_games_played=func.coalesce(User.total_games_played, 0) + len(scores),
+                total_score=func.coalesce(User.total_score, 0) + sum(scores),
+                high_score=func.greatest(func.coalesce(User.high_score, 0), max(scores))
+            )
+            .returning(previous.c.high_score)
+            .execution_options(synchronize_session=False)
+        ).first()
+        return row.high_score if row is not None else None
+
+    def _update_best_score(
+        self,
+        db: Session,
+        user_id: UUID,
+        score_data: ScoreSubmit
+    ) -> None:
+        """Upsert the user's best score for the mode/difficulty if this one beats it"""
+        self._upsert_best_scores(
+            db, user_id, {(score_data.game_mode, score_data.difficulty): score_data.score}
+        )
+
+    def _upsert_best_scores(
+        self,
+        db: Session,
+        user_id: UUID,
+        bests: Dict[Tuple[str, str], int]
+    ) -> None:
+        """Upsert the user's best score for each (mode, difficulty) it beats, in one statement"""
+        now = utc_now()
+        stmt = pg_insert(UserBestScore).values([
+            {
+                "user_id": user_id,
+                "game_mode": game_mode,
+                "difficulty": difficulty,
+                "best_score": best_score,
+                "achieved_at": now
+            }
+            for (game_mode, difficulty), best_score in bests.items()
+        ])
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[
+                UserBestScore.user_id,
+                UserBestScore.game_mode,
+                UserBestScore.difficulty
+            ],
+            set_={
+                "best_score": stmt.excluded.best_score,
+                "achieved_at": stmt.excluded.achieved_at
+            },
+            where=stmt.excluded.best_score > UserBestScore.best_score
+        ))
+
     def get_score_rank(
         self,
         db: Session,
@@ -85,6 +173,39 @@ class ScoreService:
         ).scalar()
         return (count or 0) + 1
 
+    def get_score_ranks(
+        self,
+        db: Session,
+        entries: List[Tuple[int, str, str]]
+    ) -> List[int]:
+        """Get ranks for several (score, game_mode, difficulty) entries in one query"""
+        if not entries:
+            return []
+
+        probe = values(
+            column("idx", Integer),
+            column("score", Integer),
+            column("game_mode", String),
+            column("difficulty", String),
+            name="probe"
+        ).data([
+            (idx, score_value, game_mode, difficulty)
+            for idx, (score_value, game_mode, difficulty) in enumerate(entries)
+        ])
+
+        counts = dict(
+            db.query(probe.c.idx, func.count(Score.id))
+            .select_from(probe)
+            .outerjoin(Score, and_(
+                Score.game_mode == probe.c.game_mode,
+                Score.difficulty == probe.c.difficulty,
+                Score.score > probe.c.score
+            ))
+            .group_by(probe.c.idx)
+            .all()
+        )
+        return [counts.get(idx, 0) + 1 for idx in range(len(entries))]
+
     def get_user_scores(
         self,
         db: Session,
@@ -113,9 +234,15 @@ class ScoreService:
 
     def get_user_stats(self, db: Session, user_id: UUID) -> UserScoreStats:
         """Get user's score statistics"""
-        scores = db.query(Score).filter(Score.user_id == user_id).all()
+        total_games, total_score, high_score, best_duration, total_foods = db.query(
+            func.count(Score.id),
+            func.coalesce(func.sum(Score.score), 0),
+            func.coalesce(func.max(Score.score), 0),
+            func.coalesce(func.max(Score.game_duration_seconds), 0),
+            func.coalesce(func.sum(Score.foods_eaten), 0),
+        ).filter(Score.user_id == user_id).one()
 
-        if not scores:
+        if not total_games:
             return UserScoreStats(
                 user_id=user_id,
                 high_score=0,
@@ -126,30 +253,32 @@ class ScoreService:
                 total_foods_eaten=0,
             )
 
-        total_score = sum(s.score for s in scores)
-        high_score = max(s.score for s in scores)
-        best_duration = max(s.game_duration_seconds for s in scores)
-        total_foods = sum(s.foods_eaten for s in scores)
-
-        # Group by mode and difficulty
+        # Best score per mode/difficulty pair (served by ix_scores_leaderboard_user),
+        # folded into the per-mode and per-difficulty maps
         scores_by_mode = {}
         scores_by_difficulty = {}
-        for s in scores:
-            mode = s.game_mode or "classic"
-            diff = s.difficulty or "normal"
-            if mode not in scores_by_mode or s.score > scores_by_mode[mode]:
-                scores_by_mode[mode] = s.score
-            if diff not in scores_by_difficulty or s.score > scores_by_difficulty[diff]:
-                scores_by_difficulty[diff] = s.score
+        groups = db.query(
+            Score.game_mode, Score.difficulty, func.max(Score.score)
+        ).filter(
+            Score.user_id == user_id
+        ).group_by(Score.game_mode, Score.difficulty).all()
+
+        for game_mode, difficulty, best in groups:
+            mode = game_mode or "classic"
+            diff = difficulty or "normal"
+            if best > scores_by_mode.get(mode, -1):
+                scores_by_mode[mode] = best
+            if best > scores_by_difficulty.get(diff, -1):
+                scores_by_difficulty[diff] = best
 
         return UserScoreStats(
             user_id=user_id,
             high_score=high_score,
-            total_games=len(scores),
-            total_score=total_score,
-            average_score=total_score / len(scores) if scores else 0.0,
+            total_games=total_games,
+            total_score=int(total_score),
+            average_score=int(total_score) / total_games,
             best_game_duration=best_duration,
-            total_foods_eaten=total_foods,
+            total_foods_eaten=int(total_foods),
             scores_by_mode=scores_by_mode,
             scores_by_difficulty=scores_by_difficulty,
         )
@@ -159,43 +288,175 @@ class ScoreService:
         db: Session,
         limit: int = 20,
         game_mode: Optional[str] = None
-    ) -> List[Score]:
-        """Get most recent scores"""
+    ) -> List[ScoreResponse]:
+        """Get most recent scores (cached for RECENT_SCORES_TTL seconds)"""
+        cache_key = (game_mode, limit)
+        cached = self._recent_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
         query = db.query(Score)
         if game_mode:
             query = query.filter(Score.game_mode == game_mode)
-        return query.order_by(desc(Score.created_at)).limit(limit).all()
+        recent = [
+            ScoreResponse.model_validate(s)
+            for s in query.order_by(desc(Score.created_at)).limit(limit).all()
+        ]
+        self._recent_cache.set(cache_key, recent)
+        return recent
 
     def submit_scores_batch(
         self,
         db: Session,
         user_id: UUID,
         scores: List[ScoreSubmit]
-    ) -> tuple[List[tuple[Optional[Score], bool, Optional[int], bool, Optional[str]]], Optional[int]]:
+    ) -> tuple[List[tuple[Optional[ScoreResponse], bool, Optional[int], bool, Optional[str]]], Optional[int]]:
         """
         Submit multiple scores in a single transaction (for offline sync).
         Returns: (results, new_high_score)
         Each result is (score, is_high_score, rank, was_duplicate, error)
         """
-        results = []
-        user = db.query(User).filter(User.id == user_id).first()
+        user = db.query(User.high_score).filter(User.id == user_id).first()
         original_high_score = user.high_score or 0 if user else 0
 
+        # Resolve every idempotency key in the batch with one lookup
+        keys = {s.idempotency_key for s in scores if s.idempotency_key}
+        existing: Dict[str, Score] = {}
+        if keys:
+            existing = {
+                row.idempotency_key: row
+                for row in db.query(Score).filter(Score.idempotency_key.in_(keys))
+            }
+
+        # Indexes of scores to insert; repeats of a key within the batch are duplicates
+        new_indexes = []
+        pending_keys = set()
+        for i, score_data in enumerate(scores):
+            key = score_data.idempotency_key
+            if key:
+                if key in existing or key in pending_keys:
+                    continue
+                pending_keys.add(key)
+            new_indexes.append(i)
+
+        try:
+            created = self._insert_scores(db, user_id, [scores[i] for i in new_indexes])
+        except Exception:
+            # Fall back to one-by-one submission so a bad row only fails itself
+            db.rollback()
+            return self._submit_scores_individually(db, user_id, scores)
+
+        by_index = dict(zip(new_indexes, created))
+        for score in created:
+            if score.idempotency_key:
+                existing[score.idempotency_key] = score
+
+        # Apply the batch totals in one atomic UPDATE so a concurrent
+        # submit_score's increments and high score are never overwritten.
+        # High-score flags are judged against the pre-update value, with the
+        # same strict rule as submit_score.
+        high_score = original_high_score
+        if user and created:
+            previous_high = self._apply_user_stats(db, user_id, [s.score for s in created])
+            if previous_high is not None:
+                original_high_score = previous_high
+                high_score = max(previous_high, max(s.score for s in created))
+
+        # Resolve each submission to its row and high-score flag in input order
+        running_high = original_high_score
+        resolved = []
+        for i, score_data in enumerate(scores):
+            score = by_index.get(i)
+            if score is not None:
+                is_high = bool(user) and score.score > running_high
+                if is_high:
+                    running_high = score.score
+                resolved.append((score, is_high, False))
+            else:
+                score = existing[score_data.idempotency_key]
+                resolved.append((score, bool(user) and score.score >= high_score, True))
+
+        ranks = self.get_score_ranks(
+            db, [(score.score, score.game_mode, score.difficulty) for score, _, _ in resolved]
+        )
+        # Snapshot responses while the rows are still loaded: the commit below
+        # (and any later one, e.g. achievement checks) expires them
+        responses = [ScoreResponse.model_validate(score) for score, _, _ in resolved]
+        touched_boards = {(s.game_mode, s.difficulty) for s in created}
+
+        db.commit()
+        for game_mode, difficulty in touched_boards:
+            leaderboard_service.invalidate_user_rank(user_id, game_mode, difficulty)
+
+        results = [
+            (response, is_high, rank, was_duplicate, None)
+            for response, (_, is_high, was_duplicate), rank in zip(responses, resolved, ranks)
+        ]
+        new_high = high_score if high_score > original_high_score else None
+
+        return results, new_high
+
+    def _insert_scores(
+        self,
+        db: Session,
+        user_id: UUID,
+        scores: List[ScoreSubmit]
+    ) -> List[Score]:
+        """Insert scores and their best-score upserts in bulk, returning rows in input order"""
+        if not scores:
+            return []
+
+        created = db.scalars(
+            insert(Score).returning(Score, sort_by_parameter_order=True),
+            [
+                {
+                    "user_id": user_id,
+                    "score": score_data.score,
+                    "game_duration_seconds": score_data.game_duration_seconds,
+                    "foods_eaten": score_data.foods_eaten,
+                    "game_mode": score_data.game_mode,
+                    "difficulty": score_data.difficulty,
+                    "game_data": score_data.game_data or {},
+                    "played_at": score_data.played_at,
+                    "idempotency_key": score_data.idempotency_key,
+                }
+                for score_data in scores
+            ]
+        ).all()
+
+        bests: Dict[Tuple[str, str], int] = {}
+        for score_data in scores:
+            group = (score_data.game_mode, score_data.difficulty)
+            if score_data.score > bests.get(group, -1):
+                bests[group] = score_data.score
+        self._upsert_best_scores(db, user_id, bests)
+
+        return created
+
+    def _submit_scores_individually(
+        self,
+        db: Session,
+        user_id: UUID,
+        scores: List[ScoreSubmit]
+    ) -> tuple[List[tuple[Optional[ScoreResponse], bool, Optional[int], bool, Optional[str]]], Optional[int]]:
+        """Submit scores one at a time, reporting a per-score error for any that fail"""
+        results = []
+        original_high_score = db.query(User.high_score).filter(User.id == user_id).scalar() or 0
+        submitted_high = 0
+
         for score_data in scores:
             try:
                 score, is_high, rank, was_duplicate = self.submit_score(db, user_id, score_data)
-                results.append((score, is_high, rank, was_duplicate, None))
+                results.append((ScoreResponse.model_validate(score), is_high, rank, was_duplicate, None))
+                if not was_duplicate:
+                    submitted_high = max(submitted_high, score_data.score)
             except Exception as e:
+                db.rollback()
                 results.append((None, False, None, False, str(e)))
 
-        # Check if high score was updated
-        if user:
-            db.refresh(user)
-            new_high = user.high_score if user.high_score > original_high_score else None
-        else:
-            new_high = None
+        # Check if high score was updated, from the scores we just stored
+        new_high = submitted_high if submitted_high > original_high_score else None
 
         return results, new_high
 
-
 score_service = ScoreService()
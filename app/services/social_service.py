@@ -4,7 +4,7 @@ Social service for managing friends and friend requests
 from typing import Optional, List, Tuple
 from uuid import UUID
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_
+from sqlalchemy import or_, and_, case
 
 from app.models.social import Friendship
 from app.models.user import User
@@ -15,12 +15,26 @@ from app.schemas.social import (
     FriendRequestWithUser,
     PendingRequestsResponse,
 )
+from app.utils.cache import TTLCache
 from app.utils.time_utils import utc_now
 
 
+# Seconds a user's pending friend requests are served from memory
+PENDING_REQUESTS_TTL = 15
+
+
 class SocialService:
     """Service for social/friend operations"""
 
+    def __init__(self):
+        # PendingRequestsResponse per user_id
+        self._pending_cache = TTLCache(ttl_seconds=PENDING_REQUESTS_TTL, max_size=10000)
+
+    def _invalidate_pending(self, *user_ids: UUID) -> None:
+        """Drop cached pending requests for both sides of a changed request"""
+        for uid in user_ids:
+            self._pending_cache.delete(uid)
+
     def send_friend_request(
         self,
         db: Session,
@@ -65,6 +79,7 @@ class SocialService:
                     existing.status = "accepted"
                     existing.updated_at = utc_now()
                     db.commit()
+                    self._invalidate_pending(user_id, friend.id)
                     return existing, "Friend request accepted (they already sent you one)"
             elif existing.status == "blocked":
                 raise ValueError("Unable to send friend request")
@@ -78,6 +93,7 @@ class SocialService:
         db.add(friendship)
         db.commit()
         db.refresh(friendship)
+        self._invalidate_pending(user_id, friend.id)
 
         return friendship, "Friend request sent"
 
@@ -101,6 +117,7 @@ class SocialService:
         friendship.updated_at = utc_now()
         db.commit()
         db.refresh(friendship)
+        self._invalidate_pending(user_id, friendship.user_id)
 
         return friendship
 
@@ -120,8 +137,10 @@ class SocialService:
         if not friendship:
             raise ValueError("Friend request not found")
 
+        sender_id = friendship.user_id
         db.delete(friendship)
         db.commit()
+        self._invalidate_pending(user_id, sender_id)
         return True
 
     def cancel_friend_request(
@@ -140,8 +159,10 @@ class SocialService:
         if not friendship:
             raise ValueError("Friend request not found")
 
+        recipient_id = friendship.friend_id
         db.delete(friendship)
         db.commit()
+        self._invalidate_pending(user_id, recipient_id)
         return True
 
     def remove_friend(
@@ -168,36 +189,18 @@ class SocialService:
 
     def get_friends(self, db: Session, user_id: UUID) -> FriendListResponse:
         """Get list of friends"""
-        # Get all accepted friendships
-        friendships = db.query(Friendship).filter(
-            or_(
-                Friendship.user_id == user_id,
-                Friendship.friend_id == user_id
-            ),
-            Friendship.status == "accepted"
-        ).all()
-
-        friends = []
-        for fs in friendships:
-            # Get the friend (the other person)
-            friend_id = fs.friend_id if fs.user_id == user_id else fs.user_id
-            friend_user = db.query(User).filter(User.id == friend_id).first()
-
-            if friend_user:
-                friends.append(FriendWithRequestInfo(
-                    friend=FriendInfo(
-                        id=friend_user.id,
-                        username=friend_user.username,
-                        display_name=friend_user.display_name,
-                        photo_url=friend_user.photo_url,
-                        status=friend_user.status,
-                        high_score=friend_user.high_score or 0,
-                        last_seen=friend_user.last_seen
-                    ),
-                    friendship_id=fs.id,
-                    friendship_status=fs.status,
-                    since=fs.updated_at or fs.created_at
-                ))
+        # Get all accepted friendships joined to the other person in one query
+        rows = self._friendships_with_users(db, user_id, ("accepted",))
+
+        friends = [
+            FriendWithRequestInfo(
+                friend=self._friend_info(friend_user),
+                friendship_id=fs.id,
+                friendship_status=fs.status,
+                since=fs.updated_at or fs.created_at
+            )
+            for fs, friend_user in rows
+        ]
 
         return FriendListResponse(
             friends=friends,
@@ -210,62 +213,74 @@ class SocialService:
         user_id: UUID
     ) -> PendingRequestsResponse:
         """Get pending friend requests (both incoming and outgoing)"""
-        # Incoming requests (we are friend_id)
-        incoming = db.query(Friendship).filter(
-            Friendship.friend_id == user_id,
-            Friendship.status == "pending"
-        ).all()
+        cached = self._pending_cache.get(user_id)
+        if cached is not None:
+            return cached
 
-        incoming_requests = []
-        for fs in incoming:
-            sender = db.query(User).filter(User.id == fs.user_id).first()
-            if sender:
-                incoming_requests.append(FriendRequestWithUser(
-                    request_id=fs.id,
-                    from_user=FriendInfo(
-                        id=sender.id,
-                        username=sender.username,
-                        display_name=sender.display_name,
-                        photo_url=sender.photo_url,
-                        status=sender.status,
-                        high_score=sender.high_score or 0,
-                        last_seen=sender.last_seen
-                    ),
-                    status=fs.status,
-                    created_at=fs.created_at
-                ))
-
-        # Outgoing requests (we are user_id)
-        outgoing = db.query(Friendship).filter(
-            Friendship.user_id == user_id,
-            Friendship.status == "pending"
-        ).all()
+        # Incoming (we are friend_id) and outgoing (we are user_id) requests,
+        # each joined to the other person, in one query
+        rows = self._friendships_with_users(db, user_id, ("pending",))
 
+        incoming_requests = []
         outgoing_requests = []
-        for fs in outgoing:
-            recipient = db.query(User).filter(User.id == fs.friend_id).first()
-            if recipient:
-                outgoing_requests.append(FriendRequestWithUser(
-                    request_id=fs.id,
-                    from_user=FriendInfo(
-                        id=recipient.id,
-                        username=recipient.username,
-                        display_name=recipient.display_name,
-                        photo_url=recipient.photo_url,
-                        status=recipient.status,
-                        high_score=recipient.high_score or 0,
-                        last_seen=recipient.last_seen
-                    ),
-                    status=fs.status,
-                    created_at=fs.created_at
-                ))
-
-        return PendingRequestsResponse(
+        for fs, other_user in rows:
+            request = FriendRequestWithUser(
+                request_id=fs.id,
+                from_user=self._friend_info(other_user),
+                status=fs.status,
+                created_at=fs.created_at
+            )
+            if fs.friend_id == user_id:
+                incoming_requests.append(request)
+            else:
+                outgoing_requests.append(request)
+
+        response = PendingRequestsResponse(
             incoming=incoming_requests,
             outgoing=outgoing_requests,
             incoming_count=len(incoming_requests),
             outgoing_count=len(outgoing_requests)
         )
+        self._pending_cache.set(user_id, response)
+        return response
+
+    def _friendships_with_users(
+        self,
+        db: Session,
+        user_id: UUID,
+        statuses: Tuple[str, ...]
+    ) -> List[Tuple[Friendship, User]]:
+        """Friendships involving user_id in the given statuses, each with the other person"""
+        return db.query(Friendship, User).join(
+            User, User.id == self._other_user_id(user_id)
+        ).filter(
+            or_(
+                Friendship.user_id == user_id,
+                Friendship.friend_id == user_id
+            ),
+            Friendship.status.in_(statuses)
+        ).all()
+
+    @staticmethod
+    def _other_user_id(user_id: UUID):
+        """SQL expression for the other side of a friendship involving user_id"""
+        return case(
+            (Friendship.user_id == user_id, Friendship.friend_id),
+            else_=Friendship.user_id
+        )
+
+    @staticmethod
+    def _friend_info(user: User) -> FriendInfo:
+        """Build the public friend summary for a user"""
+        return FriendInfo(
+            id=user.id,
+            username=user.username,
+            display_name=user.display_name,
+            photo_url=user.photo_url,
+            status=user.status,
+            high_score=user.high_score or 0,
+            last_seen=user.last_seen
+        )
 
     def are_friends(self, db: Session, user_id: UUID, other_user_id: UUID) -> bool:
         """Check if two users are friends"""
@@ -1,13 +1,20 @@
 """
 Tournament service for managing tournaments
 """
-from typing import Optional, List, Tuple
+from dataclasses import dataclass
+from typing import Optional, List, Tuple, Dict, Any
 from uuid import UUID
 from datetime import datetime, timedelta
-from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, and_
-
-from app.models.tournament import Tournament, TournamentEntry
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import func, desc, and_, text, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.models.tournament import (
+    Tournament,
+    TournamentEntry,
+    TOURNAMENT_LEADERBOARD_VIEW,
+    tournament_leaderboard_view,
+)
 from app.models.user import User
 from app.schemas.tournament import (
     TournamentResponse,
@@ -17,12 +24,72 @@ from app.schemas.tournament import (
     TournamentLeaderboardResponse,
     TournamentCreate,
 )
+from app.utils.cache import TTLCache
 from app.utils.time_utils import utc_now
 
 
+# Seconds a tournament leaderboard page is served from memory
+LEADERBOARD_PAGE_TTL = 15
+
+# Seconds a tournament definition is served from memory
+TOURNAMENT_CACHE_TTL = 30
+
+
+@dataclass(frozen=True, slots=True)
+class TournamentInfo:
+    """Session-independent snapshot of a tournament row"""
+    id: UUID
+    tournament_id: str
+    name: str
+    description: Optional[str]
+    type: str
+    status: str
+    start_date: datetime
+    end_date: datetime
+    entry_fee: int
+    min_level: int
+    max_players: Optional[int]
+    prize_pool: Dict[str, Any]
+    rules: Dict[str, Any]
+    created_at: datetime
+
+    @classmethod
+    def from_row(cls, tournament: Tournament) -> "TournamentInfo":
+        return cls(
+            id=tournament.id,
+            tournament_id=tournament.tournament_id,
+            name=tournament.name,
+            description=tournament.description,
+            type=tournament.type,
+            status=tournament.status,
+            start_date=tournament.start_date,
+            end_date=tournament.end_date,
+            entry_fee=tournament.entry_fee,
+            min_level=tournament.min_level,
+            max_players=tournament.max_players,
+            prize_pool=tournament.prize_pool,
+            rules=tournament.rules,
+            created_at=tournament.created_at
+        )
+
+
 class TournamentService:
     """Service for tournament operations"""
 
+    def __init__(self):
+        # Shared leaderboard pages, keyed by (tournament uuid, limit, offset)
+        self._page_cache = TTLCache(ttl_seconds=LEADERBOARD_PAGE_TTL)
+        # TournamentInfo keyed by string tournament_id
+        self._tournament_cache = TTLCache(ttl_seconds=TOURNAMENT_CACHE_TTL)
+
+    def _invalidate_leaderboard(self, tournament_uuid: UUID) -> None:
+        """
+        Drop cached leaderboard pages after a tournament's entries change.
+        Only pages ranked live pick the change up at once; pages read from the
+        materialized view lag by up to its refresh interval plus the page TTL.
+        """
+        self._page_cache.delete_where(lambda key: key[0] == tournament_uuid)
+
     def create_tournament(
         self,
         db: Session,
@@ -44,13 +111,24 @@ class TournamentService:
         db.add(tournament)
         db.commit()
         db.refresh(tournament)
+        self._tournament_cache.delete(tournament.tournament_id)
         return tournament
 
-    def get_tournament(self, db: Session, tournament_id: str) -> Optional[Tournament]:
-        """Get tournament by string ID"""
-        return db.query(Tournament).filter(
+    def get_tournament(self, db: Session, tournament_id: str) -> Optional[TournamentInfo]:
+        """Get tournament by string ID (cached for TOURNAMENT_CACHE_TTL seconds)"""
+        cached = self._tournament_cache.get(tournament_id)
+        if cached is not None:
+            return cached
+
+        tournament = db.query(Tournament).filter(
             Tournament.tournament_id == tournament_id
         ).first()
+        if not tournament:
+            return None
+
+        info = TournamentInfo.from_row(tournament)
+        self._tournament_cache.set(tournament_id, info)
+        return info
 
     def get_tournament_by_uuid(self, db: Session, uuid: UUID) -> Optional[Tournament]:
         """Get tournament by UUID"""
@@ -75,12 +153,18 @@ class TournamentService:
         total = query.count()
         tournaments = query.order_by(desc(Tournament.start_date)).offset(offset).limit(limit).all()
 
-        # Get participant counts
+        # Get participant counts for the whole page in one grouped query
+        counts = {}
+        if tournaments:
+            counts = dict(
+                db.query(TournamentEntry.tournament_id, func.count(TournamentEntry.id))
+                .filter(TournamentEntry.tournament_id.in_([t.id for t in tournaments]))
+                .group_by(TournamentEntry.tournament_id)
+                .all()
+            )
+
         tournament_responses = []
         for t in tournaments:
-            count = db.query(func.count(TournamentEntry.id)).filter(
-                TournamentEntry.tournament_id == t.id
-            ).scalar()
             tournament_responses.append(TournamentResponse(
                 id=t.id,
                 tournament_id=t.tournament_id,
@@ -93,7 +177,7 @@ class TournamentService:
                 entry_fee=t.entry_fee,
                 prize_pool=t.prize_pool or {},
                 rules=t.rules or {},
-                participant_count=count or 0,
+                participant_count=counts.get(t.id, 0),
                 created_at=t.created_at
             ))
 
@@ -114,30 +198,39 @@ class TournamentService:
     def update_tournament_statuses(self, db: Session) -> int:
         """Update tournament statuses based on dates"""
         now = utc_now()
-        updated = 0
 
         # Activate upcoming tournaments that have started
-        upcoming = db.query(Tournament).filter(
-            Tournament.status == "upcoming",
-            Tournament.start_date <= now
+        started = db.execute(
+            update(Tournament)
+            .where(Tournament.status == "upcoming", Tournament.start_date <= now)
+            .values(status="active")
+            .returning(Tournament.id, Tournament.tournament_id)
+            .execution_options(synchronize_session=False)
         ).all()
-        for t in upcoming:
-            t.status = "active"
-            updated += 1
 
         # Complete active tournaments that have ended
-        active = db.query(Tournament).filter(
-            Tournament.status == "active",
-            Tournament.end_date < now
+        ended = db.execute(
+            update(Tournament)
+            .where(Tournament.status == "active", Tournament.end_date < now)
+            .values(status="completed")
+            .returning(Tournament.id, Tournament.tournament_id)
+            .execution_options(synchronize_session=False)
         ).all()
-        for t in active:
-            t.status = "completed"
-            self._finalize_rankings(db, t.id)
-            updated += 1
 
-        if updated > 0:
+        if ended:
+            self._finalize_rankings(db, [row.id for row in ended])
+
+        if started or ended:
             db.commit()
-        return updated
+            for row in (*started, *ended):
+                self._tournament_cache.delete(row.tournament_id)
+                self._invalidate_leaderboard(row.id)
+
+        # Pull newly active tournaments into the leaderboard view now rather
+        # than waiting for the scheduled refresh
+        if started:
+            self.refresh_leaderboard_view(db)
+        return len(started) + len(ended)
 
     def join_tournament(
         self,
@@ -153,29 +246,36 @@ class TournamentService:
         if tournament.status == "completed":
             raise ValueError("Tournament has ended")
 
-        # Check if already joined
-        existing = db.query(TournamentEntry).filter(
-            TournamentEntry.tournament_id == tournament.id,
-            TournamentEntry.user_id == user_id
-        ).first()
-
-        if existing:
-            return existing, "Already joined this tournament"
-
         # Check entry fee (TODO: deduct coins if needed)
         # if tournament.entry_fee > 0:
         #     ...
 
-        entry = TournamentEntry(
-            tournament_id=tournament.id,
-            user_id=user_id,
-            best_score=0,
-            games_played=0,
-            prize_claimed=False
-        )
-        db.add(entry)
+        # Insert the entry unless one exists; the unique (tournament_id, user_id)
+        # constraint makes concurrent joins safe without a prior SELECT
+        payload = {
+            "tournament_id": tournament.id,
+            "user_id": user_id,
+            "best_score": 0,
+            "games_played": 0,
+            "prize_claimed": False,
+        }
+        inserted = db.execute(
+            pg_insert(TournamentEntry)
+            .values(**payload)
+            .on_conflict_do_nothing(constraint="unique_tournament_entry")
+            .returning(TournamentEntry.id, TournamentEntry.joined_at)
+        ).first()
+
+        if inserted is None:
+            existing = db.query(TournamentEntry).filter(
+                TournamentEntry.tournament_id == tournament.id,
+                TournamentEntry.user_id == user_id
+            ).one()
+            return existing, "Already joined this tournament"
+
         db.commit()
-        db.refresh(entry)
+        self._invalidate_leaderboard(tournament.id)
+        entry = TournamentEntry(id=inserted.id, joined_at=inserted.joined_at, rank=None, **payload)
 
         return entry, "Successfully joined tournament"
 
@@ -197,31 +297,44 @@ class TournamentService:
         if tournament.status != "active":
             raise ValueError("Tournament is not active")
 
-        entry = db.query(TournamentEntry).filter(
+        previous_best = db.query(TournamentEntry.best_score).filter(
             TournamentEntry.tournament_id == tournament.id,
             TournamentEntry.user_id == user_id
-        ).first()
+        ).scalar()
 
-        if not entry:
+        if previous_best is None:
             raise ValueError("Not joined in this tournament")
 
-        previous_best = entry.best_score
-        new_best = score > previous_best
-
-        if new_best:
-            entry.best_score = score
-        entry.games_played += 1
+        # Record the game and read back the new best together with its rank.
+        # The rank subquery is correlated to the updated row, so it counts
+        # entries ahead of the new best in the same statement.
+        ahead = aliased(TournamentEntry)
+        rank_ahead = select(func.count(ahead.id)).where(
+            ahead.tournament_id == TournamentEntry.tournament_id,
+            ahead.best_score > TournamentEntry.best_score
+        ).correlate(TournamentEntry).scalar_subquery()
+
+        current_best, ahead_count = db.execute(
+            update(TournamentEntry)
+            .where(
+                TournamentEntry.tournament_id == tournament.id,
+                TournamentEntry.user_id == user_id
+            )
+            .values(
+                best_score=func.greatest(TournamentEntry.best_score, score),
+                games_played=TournamentEntry.games_played + 1
+            )
+            .returning(TournamentEntry.best_score, rank_ahead)
+            .execution_options(synchronize_session=False)
+        ).one()
 
         db.commit()
 
-        # Calculate rank
-        rank = db.query(func.count(TournamentEntry.id)).filter(
-            TournamentEntry.tournament_id == tournament.id,
-            TournamentEntry.best_score > entry.best_score
-        ).scalar()
-        rank = (rank or 0) + 1
+        new_best = score > previous_best
+        if new_best:
+            self._invalidate_leaderboard(tournament.id)
 
-        return new_best, previous_best, entry.best_score, rank
+        return new_best, previous_best, current_best, ahead_count + 1
 
     def get_leaderboard(
         self,
@@ -236,25 +349,98 @@ class TournamentService:
         if not tournament:
             raise ValueError("Tournament not found")
 
-        # Get entries with user info
+        page_key = (tournament.id, limit, offset)
+        page = self._page_cache.get(page_key)
+        if page is None:
+            # Active tournaments read the pre-ranked view; others rank live, as
+            # do active ones the view hasn't picked up since the last refresh
+            if tournament.status == "active":
+                page = self._view_leaderboard_page(db, tournament.id, limit, offset)
+                if page[1] == 0:
+                    page = None
+            if page is None:
+                page = self._live_leaderboard_page(db, tournament.id, limit, offset)
+            self._page_cache.set(page_key, page)
+        entries, total = page
+
+        # The user's own entry is always ranked live (a few indexed lookups),
+        # so their latest join or best shows up even while the page is stale
+        user_entry = None
+        if user_id:
+            user_entry = self._live_user_entry(db, tournament.id, user_id)
+
+        return TournamentLeaderboardResponse(
+            tournament_id=tournament.id,
+            tournament_name=tournament.name,
+            entries=entries,
+            total_participants=total,
+            user_entry=user_entry
+        )
+
+    def _view_leaderboard_page(
+        self,
+        db: Session,
+        tournament_uuid: UUID,
+        limit: int,
+        offset: int
+    ) -> Tuple[List[TournamentLeaderboardEntry], int]:
+        """Read a leaderboard page from the materialized view by position range"""
+        view = tournament_leaderboard_view
+        rows = db.query(*view.c).filter(
+            view.c.tournament_id == tournament_uuid,
+            view.c.position > offset,
+            view.c.position <= offset + limit
+        ).order_by(view.c.position).all()
+
+        total = db.query(func.count()).select_from(view).filter(
+            view.c.tournament_id == tournament_uuid
+        ).scalar()
+
+        entries = [
+            TournamentLeaderboardEntry(
+                rank=row.rank,
+                user_id=row.user_id,
+                username=row.username,
+                display_name=row.display_name,
+                photo_url=row.photo_url,
+                best_score=row.best_score,
+                games_played=row.games_played
+            )
+            for row in rows
+        ]
+        return entries, total or 0
+
+    def _live_leaderboard_page(
+        self,
+        db: Session,
+        tournament_uuid: UUID,
+        limit: int,
+        offset: int
+    ) -> Tuple[List[TournamentLeaderboardEntry], int]:
+        """Rank a leaderboard page directly from tournament entries"""
+        # Get entries with user info; ranks come from the database so tied
+        # scores share a rank
         query = db.query(
             TournamentEntry,
             User.username,
             User.display_name,
-            User.photo_url
+            User.photo_url,
+            func.rank().over(order_by=desc(TournamentEntry.best_score)).label("rank")
         ).join(
             User, TournamentEntry.user_id == User.id
         ).filter(
-            TournamentEntry.tournament_id == tournament.id
+            TournamentEntry.tournament_id == tournament_uuid
         ).order_by(desc(TournamentEntry.best_score))
 
-        total = query.count()
+        total = db.query(func.count(TournamentEntry.id)).filter(
+            TournamentEntry.tournament_id == tournament_uuid
+        ).scalar()
         results = query.offset(offset).limit(limit).all()
 
         entries = []
-        for idx, (entry, username, display_name, photo_url) in enumerate(results):
+        for entry, username, display_name, photo_url, rank in results:
             entries.append(TournamentLeaderboardEntry(
-                rank=offset + idx + 1,
+                rank=rank,
                 user_id=entry.user_id,
                 username=username,
                 display_name=display_name,
@@ -262,38 +448,42 @@ class TournamentService:
                 best_score=entry.best_score,
                 games_played=entry.games_played
             ))
+        return entries, total or 0
 
-        # Get user's entry if provided
-        user_entry = None
-        if user_id:
-            user_result = db.query(TournamentEntry).filter(
-                TournamentEntry.tournament_id == tournament.id,
-                TournamentEntry.user_id == user_id
-            ).first()
-            if user_result:
-                user_rank = db.query(func.count(TournamentEntry.id)).filter(
-                    TournamentEntry.tournament_id == tournament.id,
-                    TournamentEntry.best_score > user_result.best_score
-                ).scalar()
-                user = db.query(User).filter(User.id == user_id).first()
-                user_entry = TournamentLeaderboardEntry(
-                    rank=(user_rank or 0) + 1,
-                    user_id=user_id,
-                    username=user.username if user else None,
-                    display_name=user.display_name if user else None,
-                    photo_url=user.photo_url if user else None,
-                    best_score=user_result.best_score,
-                    games_played=user_result.games_played
-                )
+    def _live_user_entry(
+        self,
+        db: Session,
+        tournament_uuid: UUID,
+        user_id: UUID
+    ) -> Optional[TournamentLeaderboardEntry]:
+        """Rank a user's entry directly from tournament entries"""
+        user_result = db.query(TournamentEntry).filter(
+            TournamentEntry.tournament_id == tournament_uuid,
+            TournamentEntry.user_id == user_id
+        ).first()
+        if not user_result:
+            return None
 
-        return TournamentLeaderboardResponse(
-            tournament_id=tournament.id,
-            tournament_name=tournament.name,
-            entries=entries,
-            total_participants=total,
-            user_entry=user_entry
+        user_rank = db.query(func.count(TournamentEntry.id)).filter(
+            TournamentEntry.tournament_id == tournament_uuid,
+            TournamentEntry.best_score > user_result.best_score
+        ).scalar()
+        user = db.query(User).filter(User.id == user_id).first()
+        return TournamentLeaderboardEntry(
+            rank=(user_rank or 0) + 1,
+            user_id=user_id,
+            username=user.username if user else None,
+            display_name=user.display_name if user else None,
+            photo_url=user.photo_url if user else None,
+            best_score=user_result.best_score,
+            games_played=user_result.games_played
         )
 
+    def refresh_leaderboard_view(self, db: Session) -> None:
+        """Refresh the active tournament leaderboard view without blocking readers"""
+        db.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {TOURNAMENT_LEADERBOARD_VIEW}"))
+        db.commit()
+
     def get_user_entry(
         self,
         db: Session,
@@ -350,16 +540,27 @@ class TournamentService:
 
         return True, "Prize claimed", prize
 
-    def _finalize_rankings(self, db: Session, tournament_uuid: UUID):
-        """Finalize rankings when tournament ends"""
-        entries = db.query(TournamentEntry).filter(
-            TournamentEntry.tournament_id == tournament_uuid
-        ).order_by(desc(TournamentEntry.best_score)).all()
-
-        for idx, entry in enumerate(entries):
-            entry.rank = idx + 1
-
-        db.commit()
-
+    def _finalize_rankings(self, db: Session, tournament_uuids: List[UUID]):
+        """Finalize rankings for tournaments that have ended (caller commits)"""
+        # Rank each tournament's entries by best score in the database and
+        # write every rank with a single UPDATE ... FROM. Uses rank() like the
+        # live leaderboard and view, so tied players share (and are paid for)
+        # the rank they were shown
+        ranked = select(
+            TournamentEntry.id,
+            func.rank().over(
+                partition_by=TournamentEntry.tournament_id,
+                order_by=desc(TournamentEntry.best_score)
+            ).label("final_rank")
+        ).where(
+            TournamentEntry.tournament_id.in_(tournament_uuids)
+        ).subquery()
+
+        db.execute(
+            update(TournamentEntry)
+            .where(TournamentEntry.id == ranked.c.id)
+            .values(rank=ranked.c.final_rank)
+            .execution_options(synchronize_session=False)
+        )
 
 tournament_service = TournamentService()
@@ -0,0 +1,73 @@
+"""
+Small in-process TTL cache.
+
+Used for short-lived caching of read-heavy query results within a single
+worker process. Entries expire after their TTL and the oldest entries are
+evicted once the cache is full.
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """Thread-safe mapping whose entries expire after a time-to-live."""
+
+    def __init__(self, ttl_seconds: float, max_size: int = 1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._data: Dict[Hashable, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value, or None if missing or expired."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        """Cache a value, optionally overriding the default TTL."""
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            self._data.pop(key, None)
+            if len(self._data) >= self.max_size:
+                self._evict()
+            self._data[key] = (time.monotonic() + ttl, value)
+
+    def delete(self, key: Hashable) -> None:
+        """Remove a single entry if present."""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_where(self, predicate: Callable[[Hashable], bool]) -> None:
+        """Remove every entry whose key matches the predicate."""
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                del self._data[key]
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        with self._lock:
+            self._data.clear()
+
+    def _evict(self) -> None:
+        """Make room for one entry by trimming from the oldest end (lock held).
+
+        Entries are kept in insertion order, so expired ones cluster at the
+        head; pop those, then the oldest live entry if still full, without
+        scanning the rest of the cache.
+        """
+        now = time.monotonic()
+        while self._data:
+            key = next(iter(self._data))
+            if self._data[key][0] > now:
+                break
+            del self._data[key]
+        if len(self._data) >= self.max_size:
+            del self._data[next(iter(self._data))]
@@ -12,40 +12,58 @@ import uvicorn
 # Add the current directory to Python path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from app.core.config import settings
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+logger = logging.getLogger(__name__)
 
 def main():
     """Main entry point for the application."""
     
+    # Imported here so importing run.py doesn't load settings
+    from app.core.config import settings
+    
+    # Read settings once
+    log_level = settings.LOG_LEVEL
+    host = settings.API_HOST
+    port = settings.API_PORT
+    is_development = settings.is_development
+    reload = settings.DEBUG and is_development
+    
     # Setup logging
     logging.basicConfig(
-        level=getattr(logging, settings.log_level.upper()),
-        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+        level=getattr(logging, log_level.upper()),
+        format=LOG_FORMAT
     )
     
-    logger = logging.getLogger(__name__)
-    
     logger.info("🐍 Starting Snake Classic Notification Backend")
-    logger.info(f"Environment: {settings.environment}")
-    logger.info(f"Host: {settings.api_host}")
-    logger.info(f"Port: {settings.api_port}")
-    logger.info(f"Firebase Project: {settings.firebase_project_id}")
+    logger.info("Environment: %s", settings.ENVIRONMENT)
+    logger.info("Host: %s", host)
+    logger.info("Port: %s", port)
+    logger.info("Firebase Project: %s", settings.firebase_project_id)
     
     try:
         # Run the application
         uvicorn.run(
             "app.main:app",
-            host=settings.api_host,
-            port=settings.api_port,
-            reload=settings.api_reload and settings.is_development,
-            log_level=settings.log_level.lower(),
-            access_log=True
+            host=host,
+            port=port,
+            reload=reload,
+            # workers and reload are mutually exclusive
+            workers=1 if reload else settings.API_WORKERS,
+            log_level=log_level.lower(),
+            # Per-request access logging only in development
+            access_log=is_development,
+            # libuv event loop and C HTTP parser from uvicorn[standard];
+            # uvloop is not available on Windows
+            loop="asyncio" if sys.platform == "win32" else "uvloop",
+            http="httptools",
+            ws="websockets"
         )
     
     except KeyboardInterrupt:
         logger.info("🛑 Server stopped by user")
     except Exception as e:
-        logger.error(f"❌ Failed to start server: {e}")
+        logger.error("❌ Failed to start server: %s", e)
         sys.exit(1)
 
 if __name__ == "__main__":
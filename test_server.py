@@ -5,107 +5,117 @@ This script tests the main endpoints without requiring real Firebase credentials
 """
 
 import asyncio
+import os
 import httpx
 import json
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 
 BASE_URL = "http://127.0.0.1:8393"
 
-async def test_health_endpoint():
+# Optional delay in seconds between tests, e.g. TEST_PACE=0.5
+TEST_PACE = float(os.environ.get("TEST_PACE", "0"))
+
+# Mock FCM token for testing
+MOCK_FCM_TOKEN = "fake_token_for_testing_purposes_123456789"
+
+JSON_HEADERS = {"content-type": "application/json"}
+
+PASS = "✅ PASS"
+FAIL = "❌ FAIL"
+
+# Constant request bodies, serialized once
+TEST_NOTIFICATION_PAYLOAD = json.dumps({
+    "fcm_token": MOCK_FCM_TOKEN,
+    "title": "🐍 Test Notification",
+    "body": "This is a test from the Snake Classic backend!",
+    "route": "home"
+}).encode()
+
+# Only scheduled_time changes between runs
+SCHEDULE_PAYLOAD_TEMPLATE = {
+    "title": "⏰ Scheduled Test",
+    "body": "This is a scheduled test notification",
+    "notification_type": "special_event",
+    "recipients": ["fake_token_123"],
+    "recipient_type": "tokens"
+}
+
+async def test_health_endpoint(client: httpx.AsyncClient):
     """Test the health check endpoint."""
     print("🩺 Testing health endpoint...")
     
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(f"{BASE_URL}/health")
-            print(f"Status: {response.status_code}")
-            print(f"Response: {response.json()}")
-            return response.status_code == 200
-        except Exception as e:
-            print(f"❌ Health check failed: {e}")
-            return False
-
-async def test_root_endpoint():
+    try:
+        response = await client.get("/health")
+        print(f"Status: {response.status_code}")
+        print(f"Response: {response.json()}")
+        return response.status_code == 200
+    except Exception as e:
+        print(f"❌ Health check failed: {e}")
+        return False
+
+async def test_root_endpoint(client: httpx.AsyncClient):
     """Test the root endpoint."""
     print("\n🏠 Testing root endpoint...")
     
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(f"{BASE_URL}/")
-            print(f"Status: {response.status_code}")
-            print(f"Response: {response.json()}")
-            return response.status_code == 200
-        except Exception as e:
-            print(f"❌ Root endpoint failed: {e}")
-            return False
-
-async def test_firebase_status():
+    try:
+        response = await client.get("/")
+        print(f"Status: {response.status_code}")
+        print(f"Response: {response.json()}")
+        return response.status_code == 200
+    except Exception as e:
+        print(f"❌ Root endpoint failed: {e}")
+        return False
+
+async def test_firebase_status(client: httpx.AsyncClient):
     """Test Firebase status endpoint."""
     print("\n🔥 Testing Firebase status...")
     
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(f"{BASE_URL}/api/v1/test/firebase-status")
-            print(f"Status: {response.status_code}")
-            print(f"Response: {response.json()}")
-            return response.status_code == 200
-        except Exception as e:
-            print(f"❌ Firebase status failed: {e}")
-            return False
-
-async def test_token_validation():
+    try:
+        response = await client.get("/api/v1/test/firebase-status")
+        print(f"Status: {response.status_code}")
+        print(f"Response: {response.json()}")
+        return response.status_code == 200
+    except Exception as e:
+        print(f"❌ Firebase status failed: {e}")
+        return False
+
+async def test_token_validation(client: httpx.AsyncClient):
     """Test FCM token validation."""
     print("\n🎫 Testing token validation...")
     
-    # Mock FCM token for testing
-    mock_token = "fake_token_for_testing_purposes_123456789"
-    
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(
-                f"{BASE_URL}/api/v1/test/validate-token",
-                params={"fcm_token": mock_token}
-            )
-            print(f"Status: {response.status_code}")
-            print(f"Response: {response.json()}")
-            return True  # This will always fail with mock credentials, but that's expected
-        except Exception as e:
-            print(f"❌ Token validation failed: {e}")
-            return False
-
-async def test_notification_sending():
+    try:
+        response = await client.post(
+            "/api/v1/test/validate-token",
+            params={"fcm_token": MOCK_FCM_TOKEN}
+        )
+        print(f"Status: {response.status_code}")
+        print(f"Response: {response.json()}")
+        return True  # This will always fail with mock credentials, but that's expected
+    except Exception as e:
+        print(f"❌ Token validation failed: {e}")
+        return False
+
+async def test_notification_sending(client: httpx.AsyncClient):
     """Test sending a test notification."""
     print("\n📱 Testing notification sending...")
     
-    # Mock FCM token for testing
-    mock_token = "fake_token_for_testing_purposes_123456789"
-    
-    test_data = {
-        "fcm_token": mock_token,
-        "title": "🐍 Test Notification",
-        "body": "This is a test from the Snake Classic backend!",
-        "route": "home"
-    }
-    
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(
-                f"{BASE_URL}/api/v1/test/send-test-notification",
-                json=test_data
-            )
-            print(f"Status: {response.status_code}")
-            print(f"Response: {response.json()}")
-            return True  # Expected to fail with mock credentials
-        except Exception as e:
-            print(f"❌ Notification sending failed: {e}")
-            return False
-
-async def test_game_notifications():
+    try:
+        response = await client.post(
+            "/api/v1/test/send-test-notification",
+            content=TEST_NOTIFICATION_PAYLOAD,
+            headers=JSON_HEADERS
+        )
+        print(f"Status: {response.status_code}")
+        print(f"Response: {response.json()}")
+        return True  # Expected to fail with mock credentials
+    except Exception as e:
+        print(f"❌ Notification sending failed: {e}")
+        return False
+
+async def test_game_notifications(client: httpx.AsyncClient):
     """Test game-specific notification templates."""
     print("\n🎮 Testing game notification templates...")
     
-    mock_token = "fake_token_for_testing_purposes_123456789"
-    
     test_cases = [
         ("achievement", "🏆 Achievement test"),
         ("tournament", "🏆 Tournament test"),
@@ -113,55 +123,54 @@ async def test_game_notifications():
         ("daily", "🐍 Daily challenge test")
     ]
     
-    async with httpx.AsyncClient() as client:
-        for message_type, description in test_cases:
-            try:
-                response = await client.post(
-                    f"{BASE_URL}/api/v1/test/quick-game-notification",
-                    params={
-                        "fcm_token": mock_token,
-                        "message_type": message_type
-                    }
-                )
-                print(f"  {description} - Status: {response.status_code}")
-                if response.status_code != 200:
-                    print(f"    Response: {response.json()}")
-            except Exception as e:
-                print(f"  {description} - ❌ Failed: {e}")
+    # The cases are independent, so send them together and report in order
+    responses = await asyncio.gather(
+        *[
+            client.post(
+                "/api/v1/test/quick-game-notification",
+                params={
+                    "fcm_token": MOCK_FCM_TOKEN,
+                    "message_type": message_type
+                }
+            )
+            for message_type, _ in test_cases
+        ],
+        return_exceptions=True
+    )
+    
+    for (_, description), response in zip(test_cases, responses):
+        if isinstance(response, Exception):
+            print(f"  {description} - ❌ Failed: {response}")
+            continue
+        print(f"  {description} - Status: {response.status_code}")
+        if response.status_code != 200:
+            print(f"    Response: {response.json()}")
 
-async def test_scheduled_notifications():
+async def test_scheduled_notifications(client: httpx.AsyncClient):
     """Test notification scheduling."""
     print("\n⏰ Testing notification scheduling...")
     
     # Schedule a notification for 1 minute from now
-    scheduled_time = (datetime.utcnow() + timedelta(minutes=1)).isoformat() + "Z"
-    
-    schedule_data = {
-        "title": "⏰ Scheduled Test",
-        "body": "This is a scheduled test notification",
-        "notification_type": "special_event",
-        "scheduled_time": scheduled_time,
-        "recipients": ["fake_token_123"],
-        "recipient_type": "tokens"
-    }
-    
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(
-                f"{BASE_URL}/api/v1/notifications/schedule",
-                json=schedule_data
-            )
-            print(f"Status: {response.status_code}")
-            print(f"Response: {response.json()}")
-            
-            # Get scheduled jobs
-            jobs_response = await client.get(f"{BASE_URL}/api/v1/notifications/scheduled")
-            print(f"Scheduled jobs: {jobs_response.json()}")
-            
-            return response.status_code == 200
-        except Exception as e:
-            print(f"❌ Scheduling failed: {e}")
-            return False
+    scheduled_time = (datetime.now(timezone.utc) + timedelta(minutes=1)).isoformat().replace("+00:00", "Z")
+    
+    schedule_data = {**SCHEDULE_PAYLOAD_TEMPLATE, "scheduled_time": scheduled_time}
+    
+    try:
+        response = await client.post(
+            "/api/v1/notifications/schedule",
+            json=schedule_data
+        )
+        print(f"Status: {response.status_code}")
+        print(f"Response: {response.json()}")
+        
+        # Get scheduled jobs
+        jobs_response = await client.get("/api/v1/notifications/scheduled")
+        print(f"Scheduled jobs: {jobs_response.json()}")
+        
+        return response.status_code == 200
+    except Exception as e:
+        print(f"❌ Scheduling failed: {e}")
+        return False
 
 async def run_all_tests():
     """Run all tests sequentially."""
@@ -180,16 +189,23 @@ async def run_all_tests():
     
     results = []
     
-    for test_name, test_func in tests:
-        print(f"\n{'=' * 20} {test_name} {'=' * 20}")
-        try:
-            result = await test_func()
-            results.append((test_name, result))
-        except Exception as e:
-            print(f"❌ {test_name} crashed: {e}")
-            results.append((test_name, False))
-        
-        await asyncio.sleep(0.5)  # Small delay between tests
+    # One pooled client for the whole run so requests reuse kept-alive connections
+    async with httpx.AsyncClient(
+        base_url=BASE_URL,
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+        timeout=10.0
+    ) as client:
+        for test_name, test_func in tests:
+            print(f"\n{'=' * 20} {test_name} {'=' * 20}")
+            try:
+                result = await test_func(client)
+                results.append((test_name, result))
+            except Exception as e:
+                print(f"❌ {test_name} crashed: {e}")
+                results.append((test_name, False))
+            
+            if TEST_PACE:
+                await asyncio.sleep(TEST_PACE)
     
     # Summary
     print(f"\n{'=' * 60}")
@@ -199,9 +215,11 @@ async def run_all_tests():
     passed = sum(1 for _, result in results if result)
     total = len(results)
     
-    for test_name, result in results:
-        status = "✅ PASS" if result else "❌ FAIL"
-        print(f"{test_name:.<30} {status}")
+    # Emit the per-test table in a single write
+    print("\n".join(
+        f"{test_name:.<30} {PASS if result else FAIL}"
+        for test_name, result in results
+    ))
     
     print(f"\nTotal: {passed}/{total} tests passed")
     